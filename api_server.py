@@ -0,0 +1,361 @@
+import argparse
+import base64
+import binascii
+import io
+import itertools
+import json
+import sys
+import time
+import zipfile
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils.exceptions import InvalidFileException
+
+from batch_attainment import make_config
+from co_processing import CoAggregates
+from header_attainment import process_file
+from job_queue import JobQueue, DONE, FAILED
+from pipeline import parse_upload
+from result_cache import shared_cache, content_hash, make_key
+from workbook_reader import open_marks, stream_attainment
+
+# Local HTTP/JSON service for CO attainment, for LMS integrations that
+# shouldn't have to drive a browser session. Standard library only:
+#
+#   python api_server.py --port 8765 --workers 4
+#
+#   GET  /health      queue and cache status
+#   POST /attainment  summary table for one course
+#   POST /processed   weighted CO marks for one course
+#   POST /batch       summaries for many courses in one request
+#
+# A course is sent either as the raw workbook (.xlsx bytes as the request
+# body, options in the query string: /attainment?method=average&layout=raw)
+# or as JSON:
+#
+#   {"sheet": [["CO1", "CO2", "CO1"], [10, 10, 5], [8, 7, 4], ...],
+#    "config": {"weights": {"CO1": 0.5, "CO2": 0.5}, "threshold": 0.6},
+#    "layout": "raw"}
+#
+# "sheet" holds the rows of the raw-data layout (co_raw_data_process.py);
+# "workbook" may replace it with base64-encoded .xlsx bytes. "config" takes
+# the batch_attainment.py config keys. layout "header" reads streamlit_app.py
+# style workbooks ("CO1 (30)" columns) and only uses the threshold. /batch
+# takes {"config": {...}, "courses": [{"id": ..., "sheet": ..., ...}, ...]};
+# each course's config overrides the shared one.
+#
+# /attainment streams raw-layout workbooks block by block like the batch
+# CLI; /processed returns every student's marks, so it reads the sheet whole.
+#
+# Requests run on a bounded JobQueue pool. Identical payloads in flight share
+# one job, and finished results stay in the shared result cache, so repeated
+# requests for the same course and parameters are answered from memory.
+
+MAX_BODY_BYTES = 64 * 1024 * 1024
+MAX_BATCH_COURSES = 1000
+JOB_TIMEOUT = 300
+LAYOUTS = ("raw", "header")
+
+# Problems with the payload itself, reported as 400 rather than 500
+INPUT_ERRORS = (ValueError, KeyError, ZeroDivisionError, zipfile.BadZipFile, InvalidFileException)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _records(df):
+    # Frame rows as JSON-ready dicts, with NaN as null
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def read_course(payload):
+    # (kind, data, digest) of the marks in a JSON course entry
+    if "workbook" in payload:
+        try:
+            data = base64.b64decode(payload["workbook"], validate=True)
+        except (binascii.Error, TypeError):
+            raise ValueError('"workbook" must be base64-encoded .xlsx bytes')
+        return "workbook", data, content_hash(data)
+    if "sheet" in payload:
+        sheet = payload["sheet"]
+        if not isinstance(sheet, list) or not all(isinstance(row, list) for row in sheet):
+            raise ValueError('"sheet" must be a list of rows')
+        return "sheet", sheet, content_hash(json.dumps(sheet, sort_keys=True).encode())
+    raise ValueError('Send the marks as "sheet" (rows of the raw layout) or "workbook" (base64 .xlsx)')
+
+
+def load_aggregates(job, kind, data, digest):
+    if kind == "workbook":
+        aggregates = parse_upload(job, data, digest)["aggregates"]
+        if aggregates is None:
+            raise ValueError("No CO labels found in the file")
+        return aggregates
+    job.report(0.1, "Grouping CO columns")
+    return shared_cache.get_or_compute(make_key("aggregates", digest),
+                                       lambda: CoAggregates.from_frame(pd.DataFrame(data)))
+
+
+def resolve_weights(unique_cos, weights):
+    # Equal weights unless given; every CO of the sheet needs one
+    if not weights:
+        return {co: 1.0 / len(unique_cos) for co in unique_cos}
+    missing = [co for co in unique_cos if co not in weights]
+    if missing:
+        raise ValueError(f"Missing weights for {', '.join(missing)}")
+    return weights
+
+
+def stream_workbook_attainment(job, data, config):
+    # Raw-layout workbooks are streamed (see workbook_reader.py): only the
+    # header rows and one block of student marks are in memory at a time
+    job.report(0.1, "Reading workbook")
+    with open_marks(io.BytesIO(data)) as workbook:
+        co_weights = resolve_weights(workbook.columns.unique_cos, config["weights"])
+    return stream_attainment(
+        io.BytesIO(data),
+        co_weights,
+        config["round_digits"],
+        config["attain_level_3_min"],
+        config["attain_level_2_min"],
+        config["attain_level_1_min"],
+        threshold=config["threshold"],
+        method=config["method"]
+    )
+
+
+def attainment_job(job, kind, data, digest, config, layout):
+    def compute():
+        if layout == "header":
+            if kind != "workbook":
+                raise ValueError('The header layout needs a "workbook" upload')
+            summary_df = process_file(io.BytesIO(data), config["threshold"])
+        elif kind == "workbook":
+            summary_df = stream_workbook_attainment(job, data, config)
+        else:
+            aggregates = load_aggregates(job, kind, data, digest)
+            summary_df = aggregates.attainment(
+                resolve_weights(aggregates.unique_cos, config["weights"]),
+                config["round_digits"],
+                config["attain_level_3_min"],
+                config["attain_level_2_min"],
+                config["attain_level_1_min"],
+                threshold=config["threshold"],
+                method=config["method"]
+            )
+        return {"summary": _records(summary_df)}
+    try:
+        return shared_cache.get_or_compute(make_key("api_attainment", digest, layout=layout, **config), compute)
+    except INPUT_ERRORS as e:
+        return {"error": str(e)}
+
+
+def processed_job(job, kind, data, digest, config, layout):
+    def compute():
+        if layout != "raw":
+            raise ValueError("Processed marks are only available for the raw layout")
+        aggregates = load_aggregates(job, kind, data, digest)
+        processed = aggregates.processed(resolve_weights(aggregates.unique_cos, config["weights"]), config["round_digits"])
+        marks = [[None if mark != mark else mark for mark in row] for row in processed.marks.tolist()]
+        return {
+            "cos": processed.unique_cos,
+            "weighted_max_marks": processed.cos["weighted_max_marks"].tolist(),
+            "students": processed.student_ids.tolist(),
+            "marks": marks,
+        }
+    try:
+        return shared_cache.get_or_compute(
+            make_key("api_processed", digest, round_digits=config["round_digits"], weights=config["weights"]),
+            compute
+        )
+    except INPUT_ERRORS as e:
+        return {"error": str(e)}
+
+
+class AttainmentService:
+    def __init__(self, workers=None, max_jobs=256, timeout=JOB_TIMEOUT):
+        self.queue = JobQueue(workers, max_jobs=max_jobs)
+        self.timeout = timeout
+        self._requests = itertools.count(1)
+
+    def run(self, func, courses):
+        # courses: [(kind, data, digest, config, layout)]. Returns one
+        # (status, result) per course, in order. At most twice the pool size
+        # is queued at a time, so a large batch can't fill the queue.
+        request_id = next(self._requests)
+        results = [None] * len(courses)
+        pending = []
+        limit = self.queue.max_workers * 2
+        for i, (kind, data, digest, config, layout) in enumerate(courses):
+            owner = ("api", request_id, i)
+            key = make_key(func.__name__, digest, layout=layout, **config)
+            pending.append((i, owner, self.queue.submit(owner, key, func, kind, data, digest, config, layout)))
+            while len(pending) >= limit or (pending and i == len(courses) - 1):
+                j, owner, job = pending.pop(0)
+                results[j] = self._finish(owner, job)
+        return results
+
+    def _finish(self, owner, job):
+        job.wait(self.timeout)
+        self.queue.release(owner)  # cancels the job if it's still running for nobody else
+        if job.status == DONE:
+            if "error" in job.result:
+                return HTTPStatus.BAD_REQUEST, job.result
+            return HTTPStatus.OK, job.result
+        if job.status == FAILED:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": job.error}
+        return HTTPStatus.GATEWAY_TIMEOUT, {"error": f"Not finished after {self.timeout} s"}
+
+
+def _query_config(query):
+    # Config from query string values, JSON-decoded where they parse
+    config = {}
+    for key, value in parse_qsl(query):
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    return config
+
+
+def _course(kind, data, digest, config=None, layout="raw", base_config=None):
+    # One validated (kind, data, digest, config, layout) work item
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r}, use one of: {', '.join(LAYOUTS)}")
+    return kind, data, digest, make_config(config, base_config), layout
+
+
+def _json_course(payload, base_config=None):
+    if not isinstance(payload, dict):
+        raise ValueError("Each course must be a JSON object")
+    return _course(*read_course(payload), payload.get("config"), payload.get("layout", "raw"), base_config)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "COAttainmentAPI/1.0"
+    service = None
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/health":
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+        self._send_json(HTTPStatus.OK, {
+            "status": "ok",
+            "workers": self.service.queue.max_workers,
+            "cache": {"entries": len(shared_cache), "bytes": shared_cache.nbytes,
+                      "hits": shared_cache.hits, "misses": shared_cache.misses},
+        })
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        routes = {"/attainment": attainment_job, "/processed": processed_job, "/batch": None}
+        if url.path not in routes:
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+        start = time.perf_counter()
+        try:
+            body = self._read_body()
+            if url.path == "/batch":
+                status, result = self._batch(body)
+            else:
+                status, result = self.service.run(routes[url.path], [self._single(url.query, body)])[0]
+        except ApiError as e:
+            status, result = e.status, {"error": str(e)}
+        except INPUT_ERRORS as e:
+            status, result = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except RuntimeError as e:  # job queue full
+            status, result = HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}
+        self._send_json(status, dict(result, seconds=round(time.perf_counter() - start, 4)))
+
+    def _single(self, query, body):
+        if self.headers.get("Content-Type", "").split(";")[0].strip() == "application/json":
+            return _json_course(self._json(body))
+        # Raw workbook upload; options come from the query string
+        config = _query_config(query)
+        layout = config.pop("layout", "raw")
+        return _course("workbook", body, content_hash(body), config, layout)
+
+    def _batch(self, body):
+        payload = self._json(body)
+        courses = payload.get("courses") if isinstance(payload, dict) else None
+        if not isinstance(courses, list):
+            raise ValueError('Send {"courses": [...]} to /batch')
+        if len(courses) > MAX_BATCH_COURSES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BATCH_COURSES} courses per batch")
+        base_config = make_config(payload.get("config"))
+        ids = [course.get("id", i) if isinstance(course, dict) else i for i, course in enumerate(courses)]
+
+        # Malformed courses fail on their own without stopping the batch
+        parsed, results = [], [None] * len(courses)
+        for i, course in enumerate(courses):
+            try:
+                parsed.append((i, _json_course(course, base_config)))
+            except INPUT_ERRORS as e:
+                results[i] = {"id": ids[i], "error": str(e)}
+        for (i, _), (_, result) in zip(parsed, self.service.run(attainment_job, [c for _, c in parsed])):
+            results[i] = dict(result, id=ids[i])
+        return HTTPStatus.OK, {"results": results}
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length must not be negative")
+        if length > MAX_BODY_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body over {MAX_BODY_BYTES} bytes")
+        return self.rfile.read(length)
+
+    def _json(self, body):
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise ValueError("Request body is not valid JSON")
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(host="127.0.0.1", port=8765, workers=None):
+    handler = type("Handler", (ApiHandler,), {"service": AttainmentService(workers)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve CO attainment over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Concurrent computations (default: up to 4)")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.workers)
+    print(f"Serving CO attainment on http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
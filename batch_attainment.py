@@ -0,0 +1,225 @@
+import argparse
+import glob
+import json
+import numbers
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import columnar_io
+from columnar_io import PARQUET_EXTENSIONS, ARROW_EXTENSIONS
+from profiling import Profiler
+from trend_store import TrendStore
+from workbook_reader import open_marks, stream_attainment
+
+# Headless batch run of process_co_data + compute_attainment_both_options
+# over many course workbooks, spread across a process pool.
+#
+#   python batch_attainment.py exports/ "archive/*.xlsx" --config config.json -o summary.csv
+#
+# Inputs may be .xlsx workbooks or .csv exports. Both are streamed in blocks,
+# so an institution-wide dump larger than memory still finishes; with
+# --processed-dir each file's processed CO marks are written there as Parquet
+# as they are computed; a file that fails leaves none behind. With --history each file's summary is also saved to
+# the attainment history (see trend_store.py) under --term, with the file
+# name as the course.
+#
+# The config is a JSON object; every key is optional:
+#   {"weights": {"CO1": 0.25, ...}, "round_digits": 2, "method": "threshold",
+#    "threshold": 0.6, "attain_level_3_min": 80, "attain_level_2_min": 60,
+#    "attain_level_1_min": 50}
+# Without "weights" each workbook's COs are weighted equally.
+
+DEFAULT_CONFIG = {
+    "weights": None,
+    "round_digits": 2,
+    "method": "threshold",
+    "threshold": 0.6,
+    "attain_level_3_min": 80,
+    "attain_level_2_min": 60,
+    "attain_level_1_min": 50,
+}
+
+
+def make_config(user_config=None, base=None):
+    # DEFAULT_CONFIG (or base) updated with user_config, validated
+    config = dict(base or DEFAULT_CONFIG)
+    if user_config:
+        unknown = set(user_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+        config.update(user_config)
+    if config["method"] not in ("threshold", "average"):
+        raise ValueError("Invalid method. Choose either 'threshold' or 'average'.")
+    for key in ("threshold", "attain_level_3_min", "attain_level_2_min", "attain_level_1_min"):
+        if not _is_number(config[key]):
+            raise ValueError(f'"{key}" must be a number')
+    if not 0 <= config["threshold"] <= 1:
+        raise ValueError('"threshold" must be between 0 and 1')
+    if not isinstance(config["round_digits"], int) or isinstance(config["round_digits"], bool) \
+            or config["round_digits"] < 0:
+        raise ValueError('"round_digits" must be a non-negative integer')
+    weights = config["weights"]
+    if weights is not None and (not isinstance(weights, dict)
+                                or not all(isinstance(co, str) and _is_number(w) for co, w in weights.items())):
+        raise ValueError('"weights" must map CO labels to numbers')
+    return config
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def load_config(path):
+    user_config = None
+    if path:
+        with open(path) as f:
+            user_config = json.load(f)
+    return make_config(user_config)
+
+
+def expand_inputs(inputs):
+    # Directories contribute their .xlsx and .csv files; anything else is a glob
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(glob.glob(os.path.join(item, "*.xlsx")))
+            paths.extend(glob.glob(os.path.join(item, "*.csv")))
+        else:
+            paths.extend(glob.glob(item))
+    # Skip Excel lock files and keep a stable order
+    return sorted({p for p in paths if not os.path.basename(p).startswith("~$")})
+
+
+def equal_weights(path):
+    with open_marks(path) as workbook:
+        unique_cos = workbook.columns.unique_cos
+    return {co: 1.0 / len(unique_cos) for co in unique_cos}
+
+
+def processed_path(path, processed_dir):
+    # Keeps the input extension so course.xlsx and course.csv don't collide
+    return os.path.join(processed_dir, os.path.basename(path) + ".parquet")
+
+
+def attainment_for_file(path, config, profiler=None, output_path=None):
+    # Streams the workbook, so a worker's memory doesn't grow with class size
+    co_weights = config["weights"] or equal_weights(path)
+    return stream_attainment(
+        path,
+        co_weights,
+        config["round_digits"],
+        config["attain_level_3_min"],
+        config["attain_level_2_min"],
+        config["attain_level_1_min"],
+        threshold=config["threshold"],
+        method=config["method"],
+        profiler=profiler,
+        output_path=output_path
+    )
+
+
+def _run_one(path, config, processed_dir=None):
+    # Worker entry point: never raises, so one bad workbook can't stop the batch
+    profiler = Profiler()
+    output_path = processed_path(path, processed_dir) if processed_dir else None
+    try:
+        return path, attainment_for_file(path, config, profiler, output_path), None, profiler.to_dict()
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}", profiler.to_dict()
+
+
+def run_batch(paths, config, workers=None, processed_dir=None):
+    # Returns the combined summary, the failures and each file's stage profile
+    summaries = []
+    failures = []
+    profiles = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_one, path, config, processed_dir) for path in paths]
+        for future in as_completed(futures):
+            path, summary_df, error, profile = future.result()
+            profiles[path] = profile
+            if error is None:
+                summary_df.insert(0, "File", path)
+                summaries.append(summary_df)
+            else:
+                failures.append((path, error))
+    summaries.sort(key=lambda s: s["File"].iat[0])
+    combined = pd.concat(summaries, ignore_index=True) if summaries else pd.DataFrame()
+    return combined, sorted(failures), dict(sorted(profiles.items()))
+
+
+def write_summary(combined, path):
+    if path.lower().endswith(PARQUET_EXTENSIONS + ARROW_EXTENSIONS):
+        columnar_io.write_summary(combined, path)
+    elif path.lower().endswith(".xlsx"):
+        with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+            combined.to_excel(writer, index=False, sheet_name='Summary')
+    else:
+        combined.to_csv(path, index=False)
+
+
+def save_history(combined, store, term, config):
+    # One saved run per file; returns the run ids
+    run_ids = []
+    for path, summary_df in combined.groupby("File", sort=False):
+        run_ids.append(store.save_run(
+            os.path.splitext(os.path.basename(path))[0],
+            term,
+            summary_df.drop(columns="File"),
+            method=config["method"],
+            threshold=config["threshold"],
+            levels=(config["attain_level_3_min"], config["attain_level_2_min"], config["attain_level_1_min"]),
+            source="batch",
+            params=config
+        ))
+    return run_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute CO attainment for a batch of course workbooks.")
+    parser.add_argument("inputs", nargs="+", help="Directories of .xlsx/.csv files or glob patterns")
+    parser.add_argument("--config", help="JSON file with weights and thresholds")
+    parser.add_argument("-o", "--output", default="attainment_summary.csv",
+                        help="Combined summary file (.csv, .xlsx, .parquet or .arrow)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--profile", help="Write per-file stage timings to this JSON file")
+    parser.add_argument("--processed-dir", help="Also write each file's processed CO marks here (Parquet)")
+    parser.add_argument("--history", help="Also save each summary to this attainment history database")
+    parser.add_argument("--term", help="Term the summaries belong to (required with --history)")
+    args = parser.parse_args(argv)
+    if args.history and not args.term:
+        parser.error("--history needs --term")
+
+    config = load_config(args.config)
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        parser.error("no .xlsx or .csv files matched the inputs")
+    if args.processed_dir:
+        os.makedirs(args.processed_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    combined, failures, profiles = run_batch(paths, config, args.workers, args.processed_dir)
+    elapsed = time.perf_counter() - start
+    if args.profile:
+        with open(args.profile, "w") as f:
+            json.dump({"wall_seconds": elapsed, "workers": args.workers or os.cpu_count(), "files": profiles},
+                      f, indent=2)
+
+    if not combined.empty:
+        write_summary(combined, args.output)
+        if args.history:
+            save_history(combined, TrendStore(args.history), args.term, config)
+    for path, error in failures:
+        print(f"FAILED {path}: {error}", file=sys.stderr)
+    print(f"{len(paths) - len(failures)} of {len(paths)} workbooks processed in {elapsed:.1f} s"
+          + (f", summary written to {args.output}" if not combined.empty else ""))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
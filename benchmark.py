@@ -0,0 +1,303 @@
+import argparse
+import io
+import json
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from co_processing import CoAggregates, find_co_row, process_co_data_loop, round_marks
+from exports import processed_to_csv_zip, processed_to_xlsx
+from header_attainment import process_file
+from profiling import Profiler
+from score_index import ScoreIndex
+from table_view import marks_stats, processed_page, sheet_stats
+from workbook_reader import stream_attainment
+
+# Benchmark suite for both attainment pipelines on synthetic workbooks.
+#
+# The raw-data layout (co_raw_data_process.py) gets header rows, identity
+# columns and duplicate CO columns in shuffled order, like sample_df; the
+# header layout (streamlit_app.py) gets "CO1 (30)" style columns, one of
+# them repeated, and its summary is checked against a direct count. Every
+# stage is timed (and traced for peak memory with --memory) across a sweep
+# of sizes, and results can be saved and compared between versions:
+#
+#   python benchmark.py --students 1000,20000 --columns 30,120 --cos 6,12 -o before.json
+#   python benchmark.py --students 1000,20000 --columns 30,120 --cos 6,12 --compare before.json
+#
+# --compare exits with status 1 when a stage got slower than --tolerance.
+# --include-loop also times the original per-student process_co_data loop
+# and checks that process_co_data reproduces its output exactly (exit
+# status 1 otherwise), including round() on marks next to .5 ties.
+
+MIN_COMPARE_SECONDS = 0.005
+
+
+def make_sheet(students, columns, cos, seed=0):
+    # Bare raw layout: CO row, max marks row, student rows
+    rng = np.random.default_rng(seed)
+    co_labels = [f"CO{(j % cos) + 1}" for j in range(columns)]
+    max_marks = rng.integers(5, 21, size=columns)
+    marks = rng.integers(0, max_marks + 1, size=(students, columns))
+    rows = [co_labels, max_marks.tolist()] + marks.tolist()
+    return pd.DataFrame(rows)
+
+
+def make_raw_workbook(students, columns, cos, seed=0):
+    # Raw layout as teachers upload it: course header rows, NAME / ROLL NUMBER /
+    # SECTION columns, every CO at least once plus duplicates in shuffled order
+    rng = np.random.default_rng(seed)
+    co_labels = [f"CO{(j % cos) + 1}" for j in range(max(columns, cos))]
+    rng.shuffle(co_labels)
+    max_marks = rng.integers(5, 31, size=len(co_labels))
+    marks = rng.integers(0, max_marks + 1, size=(students, len(co_labels))).astype(np.float64)
+    marks[rng.random(marks.shape) < 0.1] += 0.5  # some half marks
+    marks = np.minimum(marks, max_marks)
+
+    identity = ["NAME", "ROLL NUMBER", "SECTION"]
+    width = len(identity) + len(co_labels)
+    rows = [
+        ["Course: BENCH101"] + [None] * (width - 1),
+        ["Semester", "Fall"] + [None] * (width - 2),
+        identity + co_labels,
+        [None] * len(identity) + max_marks.tolist(),
+    ]
+    sections = rng.choice(["A", "B", "C", "D"], size=students)
+    for i in range(students):
+        rows.append([f"Student {i + 1}", f"R{i + 1:06d}", sections[i]] + marks[i].tolist())
+    return pd.DataFrame(rows)
+
+
+def make_header_workbook(students, cos, seed=0, repeated=1):
+    # streamlit_app.py layout: NAME, ROLL NUMBER, "CO1 (30)", ..., then a
+    # second column under the same header for the first `repeated` COs
+    rng = np.random.default_rng(seed)
+    columns = [
+        ("NAME", [f"Student {i + 1}" for i in range(students)]),
+        ("ROLL NUMBER", [f"R{i + 1:06d}" for i in range(students)]),
+    ]
+    max_marks = []
+    for k in range(cos):
+        max_marks.append(int(rng.integers(10, 51)))
+        columns.append((f"CO{k + 1} ({max_marks[k]})", rng.integers(0, max_marks[k] + 1, size=students)))
+    for k in range(min(repeated, cos)):
+        columns.append((f"CO{k + 1} ({max_marks[k]})", rng.integers(0, max_marks[k] + 1, size=students)))
+    df = pd.DataFrame({j: values for j, (_, values) in enumerate(columns)})
+    df.columns = [name for name, _ in columns]
+    return df
+
+
+def to_xlsx_bytes(df, header):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, header=header, index=False)
+    return buffer.getvalue()
+
+
+class OutputMismatch(Exception):
+    pass
+
+
+def check_matches_loop(output_df, expected_df):
+    # Same cells with the same types, floats bit for bit: the CSV text uses
+    # the shortest repr of every float and tells 1 from 1.0
+    if output_df.shape != expected_df.shape:
+        raise OutputMismatch(f"process_co_data shape {output_df.shape}, loop {expected_df.shape}")
+    if output_df.to_csv(index=False) != expected_df.to_csv(index=False):
+        for (i, j), value in np.ndenumerate(output_df.to_numpy(dtype=object)):
+            expected = expected_df.iat[i, j]
+            if repr(value) != repr(expected) and not (value != value and expected != expected):
+                raise OutputMismatch(f"process_co_data row {i} column {j}: {value!r}, loop {expected!r}")
+        raise OutputMismatch("process_co_data output differs from the loop")
+
+
+def check_header_attainment(summary_df, workbook, threshold):
+    # process_file against a direct count over every CO column of the header
+    # workbook, repeated headers included, in sheet order
+    expected = []
+    for j, name in enumerate(workbook.columns):
+        match = re.fullmatch(r"CO\d+ \((\d+)\)", name)
+        if match:
+            expected.append(int((workbook.iloc[:, j] >= threshold * int(match[1])).sum()))
+    actual = summary_df["No of Students Scored Expected Marks"].tolist()
+    if actual != expected:
+        raise OutputMismatch(f"process_file counts {actual}, expected {expected} for {summary_df['CO'].tolist()}")
+
+
+def check_round_marks(digits=(0, 1, 2, 3)):
+    # round_marks against Python's round() on values at, and one ulp either
+    # side of, .5 ties, and on weighted fractions like the ones scaling makes
+    ties = np.arange(-2000, 2000) + 0.5
+    fractions = (np.arange(0, 41)[:, None] / np.arange(1, 41)).ravel()
+    weights = np.array([1 / 3, 1 / 6, 0.15, 0.2, 0.25, 1 / 7]) * 100
+    for round_digits in digits:
+        at_ties = ties / 10.0 ** round_digits
+        values = np.concatenate([at_ties, np.nextafter(at_ties, np.inf), np.nextafter(at_ties, -np.inf),
+                                 np.outer(fractions, weights).ravel()])
+        expected = np.array([round(float(v), round_digits) for v in values])
+        actual = round_marks(values, round_digits)
+        if actual.tobytes() != expected.tobytes():
+            k = int(np.flatnonzero(actual.view(np.int64) != expected.view(np.int64))[0])
+            raise OutputMismatch(f"round_marks({float(values[k])!r}, {round_digits}) = {float(actual[k])!r}, "
+                                 f"round() = {float(expected[k])!r}")
+
+
+def run_case(students, columns, cos, seed=0, track_memory=False, include_loop=False):
+    # One size point; returns its stage records
+    raw_bytes = to_xlsx_bytes(make_raw_workbook(students, columns, cos, seed), header=False)
+    header_workbook = make_header_workbook(students, cos, seed)
+    header_bytes = to_xlsx_bytes(header_workbook, header=True)
+    co_weights = {f"CO{k + 1}": 1.0 / cos for k in range(cos)}
+    profiler = Profiler(track_memory=track_memory)
+
+    with profiler.stage("raw.read_excel") as record:
+        df = pd.read_excel(io.BytesIO(raw_bytes), header=None)
+        record["rows"], record["columns"] = df.shape
+    with profiler.stage("raw.find_co_row", *df.shape):
+        co_row = find_co_row(df)
+    with profiler.stage("raw.aggregates", students, columns):
+        aggregates = CoAggregates.from_frame(df, co_row)
+    with profiler.stage("raw.processed_marks", students, cos):
+        processed = aggregates.processed(co_weights)
+    with profiler.stage("raw.process_co_data", students, cos):
+        output_df = aggregates.output_df(co_weights)
+    if include_loop:
+        with profiler.stage("raw.process_co_data_loop", students, cos):
+            loop_df = process_co_data_loop(df, co_weights)
+        check_matches_loop(output_df, loop_df)
+    with profiler.stage("raw.attainment_threshold", students, cos):
+        aggregates.attainment(co_weights, method="threshold")
+    with profiler.stage("raw.attainment_average", students, cos):
+        aggregates.attainment(co_weights, method="average")
+    with profiler.stage("raw.score_index", students, cos):
+        score_index = ScoreIndex.from_aggregates(aggregates, co_weights)
+    with profiler.stage("raw.attainment_curve", 101, cos):
+        score_index.attainment_curve()
+    with profiler.stage("raw.sheet_stats", *df.shape):
+        sheet_stats(df, co_row)
+    with profiler.stage("raw.marks_stats", students, cos):
+        marks_stats(score_index)
+    with profiler.stage("raw.score_distribution", 20, cos):
+        score_index.distribution()
+    with profiler.stage("raw.processed_page", 100, cos):
+        processed_page(processed, 0, 100)
+    with profiler.stage("raw.processed_xlsx", *processed.marks.shape):
+        processed_to_xlsx(processed)
+    with profiler.stage("raw.processed_csv_zip", *processed.marks.shape):
+        processed_to_csv_zip(processed, "processed_co_data.csv")
+    with profiler.stage("raw.stream_attainment", students, columns):
+        stream_attainment(io.BytesIO(raw_bytes), co_weights)
+    with profiler.stage("header.process_file", students, cos):
+        header_summary = process_file(io.BytesIO(header_bytes), 0.6)
+    check_header_attainment(header_summary, header_workbook, 0.6)
+
+    return {"students": students, "columns": columns, "cos": cos, "stages": profiler.stages}
+
+
+def best_of(runs):
+    # Fastest time per stage over repeated runs (memory from the same run)
+    best = {}
+    for run in runs:
+        for record in run["stages"]:
+            current = best.get(record["stage"])
+            if current is None or record["seconds"] < current["seconds"]:
+                best[record["stage"]] = record
+    return dict(runs[0], stages=list(best.values()))
+
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    # Print per-stage ratios against a saved run; return the regressions
+    def index(cases):
+        return {(c["students"], c["columns"], c["cos"], r["stage"]): r["seconds"]
+                for c in cases for r in c["stages"]}
+    old, new = index(baseline["cases"]), index(results["cases"])
+    regressions = []
+    print(f"\nCompared with {baseline['environment'].get('git_revision') or 'baseline'}:")
+    if baseline["environment"].get("track_memory") != results["environment"]["track_memory"]:
+        print("  warning: only one of the runs traced memory, which slows every stage down")
+    for key in sorted(new.keys() & old.keys()):
+        ratio = new[key] / old[key] if old[key] else float("inf")
+        slower = ratio > 1 + tolerance and new[key] - old[key] > MIN_COMPARE_SECONDS
+        if slower:
+            regressions.append(key)
+        students, columns, cos, stage = key
+        print(f"  {students:>7} x {columns:>4} x {cos:>3}  {stage:<28} {old[key]:9.4f} -> {new[key]:9.4f} s"
+              f"  {ratio:5.2f}x{'  REGRESSION' if slower else ''}")
+    return regressions
+
+
+def parse_sizes(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def run_sizes(results, students, columns, cos, args):
+    runs = [run_case(students, columns, cos, args.seed, args.memory, args.include_loop)
+            for _ in range(args.repeat)]
+    case = best_of(runs)
+    results["cases"].append(case)
+    print(f"{students} students x {columns} columns, {cos} COs")
+    for record in case["stages"]:
+        memory = record["peak_memory_bytes"]
+        print(f"  {record['stage']:<28} {record['seconds']:9.4f} s"
+              + (f"  {memory / 2**20:8.1f} MiB" if memory is not None else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CO attainment pipelines")
+    parser.add_argument("--students", type=parse_sizes, default=[1000, 10000])
+    parser.add_argument("--columns", type=parse_sizes, default=[60])
+    parser.add_argument("--cos", type=parse_sizes, default=[6])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory", action="store_true", help="Trace peak memory per stage (slower)")
+    parser.add_argument("--include-loop", action="store_true", help="Also time the per-student reference loop")
+    parser.add_argument("-o", "--output", help="Save results as JSON")
+    parser.add_argument("--compare", help="Saved results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a stage is flagged")
+    args = parser.parse_args(argv)
+
+    results = {"environment": dict(environment(), track_memory=args.memory), "cases": []}
+    try:
+        if args.include_loop:
+            check_round_marks()
+        for students in args.students:
+            for columns in args.columns:
+                for cos in args.cos:
+                    run_sizes(results, students, columns, cos, args)
+    except OutputMismatch as e:
+        print(f"MISMATCH {e}", file=sys.stderr)
+        return 1
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import re
+
+import numpy as np
+
+# Header analysis for CO sheets: which row holds the CO labels and which
+# column belongs to which CO. A cell is a CO label when the whole cell is
+# "CO<n>", optionally followed by the max marks in brackets as in the
+# header-style layout ("CO1 (30)"). Matching whole cells means "CO1" never
+# picks up "CO10".."CO19" and headers like "COURSE" are not mistaken for COs.
+#
+# CoColumns is computed once per sheet layout and shared by every later
+# stage: the CO scaling, identity extraction, streamed blocks and the UI.
+
+CO_LABEL = re.compile(r"\s*(CO(\d+))\s*(?:\(\s*(\d+(?:\.\d+)?)\s*\))?\s*")
+# pandas' suffix for a repeated column header: a second "CO1 (30)" is read as "CO1 (30).1"
+PANDAS_DUPLICATE = re.compile(r"\.\d+$")
+# Headers that mention a CO and max marks without being a CO label, e.g. "Quiz CO3 (20)"
+CO_MENTION = re.compile(r"CO.*\(\s*\d+(?:\.\d+)?\s*\)")
+
+
+def match_co_label(cell):
+    # (canonical label, max marks or None) for a CO header cell, else None
+    if not isinstance(cell, str):
+        return None
+    match = CO_LABEL.fullmatch(cell)
+    if match is None:
+        return None
+    label, _, max_marks = match.groups()
+    if max_marks is not None:
+        max_marks = float(max_marks) if "." in max_marks else int(max_marks)
+    return label, max_marks
+
+
+def header_max_marks(columns):
+    # Header layout: ({column: max marks} of the CO columns, [skipped headers]).
+    # Repeated CO headers are kept under pandas' name for them; headers that
+    # mention a CO and marks but aren't a CO label are returned as skipped
+    # so the caller can warn about them.
+    max_marks = {}
+    skipped = []
+    for column in columns:
+        if not isinstance(column, str):
+            continue
+        match = match_co_label(PANDAS_DUPLICATE.sub("", column))
+        if match is not None and match[1] is not None:
+            max_marks[column] = match[1]
+        elif CO_MENTION.search(column):
+            skipped.append(column)
+    return max_marks, skipped
+
+
+def is_co_row(row):
+    return any(isinstance(cell, str) and CO_LABEL.fullmatch(cell) for cell in row)
+
+
+def find_co_row(rows, scan_rows=None):
+    # Position of the first row holding a CO label, or None. rows is any
+    # iterable of row sequences and is consumed only up to the match (or
+    # scan_rows rows), so it can be a lazy reader.
+    for i, row in enumerate(rows):
+        if scan_rows is not None and i >= scan_rows:
+            break
+        if is_co_row(row):
+            return i
+    return None
+
+
+class CoColumns:
+    def __init__(self, labels):
+        # labels: the cells of the CO row (or a frame's column names)
+        self.labels = list(labels)
+        matches = [match_co_label(cell) for cell in self.labels]
+        # Canonical CO of every column (None for identity columns) and the
+        # max marks written in its header, if any
+        self.cos = [match[0] if match else None for match in matches]
+        self.header_max_marks = [match[1] if match else None for match in matches]
+
+        # Unique COs sorted in 'CO1', 'CO2', ... order
+        self.unique_cos = sorted({co for co in self.cos if co is not None}, key=lambda co: int(co[2:]))
+        position = {co: k for k, co in enumerate(self.unique_cos)}
+
+        # Sheet positions of the CO columns, and each one's index in unique_cos
+        self.co_columns = np.array([j for j, co in enumerate(self.cos) if co is not None], dtype=np.intp)
+        self.co_positions = np.array([position[self.cos[j]] for j in self.co_columns], dtype=np.intp)
+
+    @property
+    def grouping(self):
+        # (CO columns x unique COs) matrix, 1.0 where a column belongs to a CO
+        grouping = np.zeros((len(self.co_columns), len(self.unique_cos)), dtype=np.float64)
+        grouping[np.arange(len(self.co_columns)), self.co_positions] = 1.0
+        return grouping
@@ -0,0 +1,438 @@
+import numbers
+
+import numpy as np
+import pandas as pd
+
+from co_columns import CoColumns, find_co_row as find_label_row
+
+# Core CO computations shared by the Streamlit apps and other entry points.
+# Nothing in this module may import streamlit.
+
+
+def find_co_row(df, scan_rows=None):
+    # Position of the first row containing a CO label, or None
+    return find_label_row(df.itertuples(index=False, name=None), scan_rows)
+
+
+def co_fractions(marks, grouping, max_co_totals):
+    # marks: (students x columns) float array of raw marks
+    # Returns (students x COs) share of each CO's max marks, before weighting.
+    if marks.shape[0] and np.any(max_co_totals == 0):
+        raise ZeroDivisionError("division by zero")
+    # Sum each CO's columns in sheet order so the float result matches the
+    # sequential sum() of the reference loop bit for bit.
+    totals = np.zeros((marks.shape[0], grouping.shape[1]), dtype=np.float64)
+    for j, k in zip(*np.nonzero(grouping)):
+        totals[:, k] += marks[:, j]
+    return totals / max_co_totals
+
+
+def round_marks(scaled, round_digits):
+    # Same results as Python's round() on every mark, which the legacy loop
+    # used. np.round agrees with it except where scaling by 10**digits lands
+    # within a few ulps of a .5 tie; only those marks go through round().
+    rounded = np.round(scaled, round_digits)
+    shifted = scaled * 10.0 ** round_digits
+    with np.errstate(invalid="ignore"):
+        near_tie = np.abs(np.abs(shifted - np.floor(shifted)) - 0.5) <= 8 * np.finfo(np.float64).eps * np.abs(shifted)
+    for index in zip(*np.nonzero(near_tie)):
+        rounded[index] = round(float(scaled[index]), round_digits)
+    return rounded
+
+
+def _max_mark(label, value):
+    # A CO column's max marks must be a number; an empty cell counts as NaN,
+    # as in a sheet read by pandas
+    if value is None:
+        return np.nan
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        raise ValueError(f"Max marks for column {label!r} must be a number, got {value!r}")
+    return value
+
+
+class CoScaling:
+    # Everything process_co_data derives from the CO row and max marks row.
+    # Built once per sheet and reused for every block of student rows and
+    # every set of weights.
+
+    def __init__(self, co_labels, max_marks, columns=None):
+        # columns: the sheet's CoColumns, when the caller already built it
+        self.columns = columns if columns is not None else CoColumns(co_labels)
+        self.unique_cos = self.columns.unique_cos
+
+        # Group COs and their corresponding marks
+        co_groups = {co: [] for co in self.unique_cos}
+        for label, co, max_mark in zip(self.columns.labels, self.columns.cos, max_marks):
+            if co is not None:
+                co_groups[co].append(_max_mark(label, max_mark))
+
+        # Calculate total marks for each CO group
+        self.co_totals = {co: sum(marks) for co, marks in co_groups.items()}
+
+        # Calculate total of all CO marks
+        self.total_co_marks = sum(self.co_totals.values())
+
+        # Sheet columns that carry CO marks, and their grouping onto unique_cos
+        self.co_columns = self.columns.co_columns
+        self.grouping = self.columns.grouping
+        self.max_co_totals = np.array([self.co_totals[co] for co in self.unique_cos], dtype=np.float64)
+
+    def weighted_max_marks(self, co_weights):
+        # Weighted max marks for each CO (without rounding)
+        return {co: self.total_co_marks * co_weights[co] for co in self.unique_cos}
+
+    def fractions(self, marks):
+        # marks: (students x len(co_columns)) raw marks of the CO columns only
+        return co_fractions(marks, self.grouping, self.max_co_totals)
+
+
+def header_metadata(headers):
+    # Course-level facts from the rows above the CO row, written either as
+    # "Key: Value" in one cell or as a row holding just a key and a value.
+    # Other header rows (titles, notes) are ignored.
+    metadata = {}
+    for row in headers:
+        cells = [cell for cell in row if cell is not None and not (isinstance(cell, float) and np.isnan(cell))]
+        if not cells or not isinstance(cells[0], str):
+            continue
+        key, colon, value = cells[0].partition(":")
+        if colon and value.strip() and len(cells) == 1:
+            metadata[key.strip()] = value.strip()
+        elif len(cells) == 2:
+            metadata[key.strip()] = cells[1]
+    return metadata
+
+
+def student_identity(df, co_row, co_columns, headers=()):
+    # Non-CO columns (name, roll number, section, ...) of every student row,
+    # named after their label in the CO row, plus the course-level header
+    # metadata repeated for each student. Repeated names get pandas' suffixes
+    # (a second "Section" column is "Section.1"), and a metadata key that
+    # clashes with a column is the one renamed.
+    co_columns = set(co_columns.tolist())
+    labels = df.iloc[co_row].tolist()
+    students = df.iloc[co_row + 2:]
+    taken = set()
+    columns = []
+    for j, label in enumerate(labels):
+        if j in co_columns:
+            continue
+        name = label.strip() if isinstance(label, str) and label.strip() else f"Column {j + 1}"
+        columns.append((_unique_name(name, taken), j))
+    identity = {}
+    for key, value in header_metadata(headers).items():
+        identity[_unique_name(str(key), taken)] = [value] * len(students)
+    for name, j in columns:
+        identity[name] = students.iloc[:, j].tolist()
+    return pd.DataFrame(identity, index=pd.RangeIndex(len(students)))
+
+
+def _unique_name(name, taken):
+    # name, or name.1, name.2, ... if already taken; records the result
+    unique, i = name, 0
+    while unique in taken:
+        i += 1
+        unique = f"{name}.{i}"
+    taken.add(unique)
+    return unique
+
+
+class CoAggregates:
+    # Weight-independent results of one sheet: the header rows, the CO layout,
+    # every student's share of each CO's max marks and the identity columns
+    # bound to each student. Changing weights, rounding or thresholds only
+    # needs (students x COs) array work on top.
+
+    def __init__(self, headers, scaling, fractions, identity=None):
+        self.headers = headers
+        self.scaling = scaling
+        self.fractions = fractions
+        if identity is None:
+            identity = pd.DataFrame(index=pd.RangeIndex(len(fractions)))
+        self.identity = identity
+
+    @classmethod
+    def from_frame(cls, df, co_row=None):
+        # Find the row with CO labels, unless the caller already did
+        if co_row is None:
+            co_row = find_co_row(df)
+        if co_row is None:
+            raise ValueError("No CO labels found in the file")
+
+        # Extract headers, CO labels and max marks; student marks stay in the frame
+        headers = df.iloc[:co_row].values.tolist() if co_row > 0 else []
+        scaling = CoScaling(df.iloc[co_row].tolist(), df.iloc[co_row + 1].tolist())
+        marks = df.iloc[co_row + 2:, scaling.co_columns].to_numpy(dtype=np.float64)
+        identity = student_identity(df, co_row, scaling.co_columns, headers)
+        return cls(headers, scaling, scaling.fractions(marks), identity)
+
+    @property
+    def nbytes(self):
+        # Rough footprint, used by result_cache for eviction
+        return (self.fractions.nbytes + 64 * sum(len(row) for row in self.headers)
+                + int(self.identity.memory_usage(index=True, deep=True).sum()))
+
+    @property
+    def unique_cos(self):
+        return self.scaling.unique_cos
+
+    def weighted_marks(self, co_weights, round_digits=2):
+        # Rounded weighted marks as a (students x COs) float array
+        weighted_max = np.array(list(self.scaling.weighted_max_marks(co_weights).values()), dtype=np.float64)
+        return round_marks(self.fractions * weighted_max, round_digits)
+
+    def processed(self, co_weights, round_digits=2, dtype=np.float64):
+        # The process_co_data result for these weights as ProcessedMarks
+        weighted_max_marks = self.scaling.weighted_max_marks(co_weights)
+        return ProcessedMarks(self.weighted_marks(co_weights, round_digits), self.unique_cos,
+                              [weighted_max_marks[co] for co in self.unique_cos], headers=self.headers,
+                              round_digits=round_digits, dtype=dtype)
+
+    def output_df(self, co_weights, round_digits=2):
+        # The process_co_data frame for these weights
+        return self.processed(co_weights, round_digits).to_frame()
+
+    def attainment(self, co_weights, round_digits=2, attain_level_3_min=80, attain_level_2_min=60,
+                   attain_level_1_min=50, threshold=0.6, method="threshold", report=None):
+        # compute_attainment_both_options straight from the aggregates
+        marks = self.weighted_marks(co_weights, round_digits)
+        weighted_max_marks = self.scaling.weighted_max_marks(co_weights)
+        return attainment_from_marks(self.unique_cos, weighted_max_marks, marks, attain_level_3_min,
+                                     attain_level_2_min, attain_level_1_min, threshold, method, report)
+
+
+class ProcessedMarks:
+    # Typed form of the process_co_data result. Instead of one object frame
+    # mixing header, label, max marks and student rows it keeps:
+    #   marks       (students x COs) float64 or float32 array, column-major so
+    #               each CO's scores are contiguous
+    #   cos         CO metadata vector: label and weighted max marks per CO
+    #   student_ids "Student 1", "Student 2", ... as a string array
+    #   headers     rows above the CO row in the input, as lists
+    # The attainment functions, ScoreIndex and the exporters read these
+    # arrays directly; to_frame() rebuilds the legacy frame.
+
+    def __init__(self, marks, unique_cos, weighted_max_marks, student_ids=None, headers=(), round_digits=None,
+                 dtype=np.float64):
+        self.marks = np.asarray(marks, dtype=dtype, order="F").reshape(-1, len(unique_cos), order="F")
+        self.cos = np.array(list(zip(unique_cos, weighted_max_marks)),
+                            dtype=[("label", object), ("weighted_max_marks", np.float64)])
+        if student_ids is None:
+            student_ids = [f"Student {i}" for i in range(1, len(self.marks) + 1)]
+        self.student_ids = np.asarray(student_ids, dtype=object)
+        self.headers = [list(row) for row in headers]
+        self.round_digits = round_digits
+
+    @classmethod
+    def from_frame(cls, output_df):
+        # Parse a legacy process_co_data frame
+        first_column = output_df.iloc[:, 0].tolist()
+        co_row = first_column.index("CO")
+        labels = output_df.iloc[co_row, 1:].tolist()
+        n_cos = sum(1 for co in labels if isinstance(co, str))
+        students = output_df.iloc[co_row + 2:]
+        return cls(students.iloc[:, 1:n_cos + 1].to_numpy(dtype=np.float64), labels[:n_cos],
+                   output_df.iloc[co_row + 1, 1:n_cos + 1].tolist(), students.iloc[:, 0].tolist(),
+                   output_df.iloc[:co_row].values.tolist())
+
+    @property
+    def unique_cos(self):
+        return self.cos["label"].tolist()
+
+    @property
+    def weighted_max_marks(self):
+        return dict(zip(self.unique_cos, self.cos["weighted_max_marks"].tolist()))
+
+    @property
+    def total_students(self):
+        return len(self.marks)
+
+    @property
+    def nbytes(self):
+        # Rough footprint, used by result_cache for eviction
+        return self.marks.nbytes + 64 * len(self.student_ids) + 64 * sum(len(row) for row in self.headers)
+
+    def column(self, co):
+        # One CO's scores, a view into marks
+        return self.marks[:, self.unique_cos.index(co)]
+
+    def attainment(self, attain_level_3_min=80, attain_level_2_min=60, attain_level_1_min=50, threshold=0.6,
+                   method="threshold", report=None):
+        return attainment_from_marks(self.unique_cos, self.weighted_max_marks, self.marks, attain_level_3_min,
+                                     attain_level_2_min, attain_level_1_min, threshold, method, report)
+
+    def marks_list(self):
+        # Student marks as Python floats. float32 marks go back through the
+        # original rounding so they read like the float64 ones.
+        marks = self.marks
+        if marks.dtype != np.float64:
+            marks = marks.astype(np.float64)
+            if self.round_digits is not None:
+                marks = np.round(marks, self.round_digits)
+        return marks.tolist()
+
+    def to_frame(self):
+        # The legacy process_co_data frame
+        unique_cos = self.unique_cos
+        output_data = [list(row) for row in self.headers] + [
+            ["CO"] + unique_cos,
+            ["Weighted Max Marks"] + self.cos["weighted_max_marks"].tolist()
+        ]
+        for student, marks in zip(self.student_ids.tolist(), self.marks_list()):
+            output_data.append([student] + marks)
+        return pd.DataFrame(output_data)
+
+
+def process_co_data(df, co_weights, round_digits=2):
+    # Weighted marks for every student in one batched pass
+    return CoAggregates.from_frame(df).output_df(co_weights, round_digits)
+
+
+def process_co_marks(df, co_weights, round_digits=2, dtype=np.float64):
+    # process_co_data as ProcessedMarks
+    return CoAggregates.from_frame(df).processed(co_weights, round_digits, dtype)
+
+
+def compute_attainment_both_options(output_df, attain_level_3_min=80,attain_level_2_min=60,attain_level_1_min=50,threshold=0.6, method="threshold", report=None):
+    # ProcessedMarks are counted straight from their score array
+    if isinstance(output_df, ProcessedMarks):
+        return output_df.attainment(attain_level_3_min, attain_level_2_min, attain_level_1_min, threshold,
+                                    method, report)
+
+    # Extract the CO labels and weighted max marks from the output DataFrame
+    co_labels = output_df.iloc[0, 1:].tolist()  # Skipping the first column (CO label row)
+    weighted_max_marks = output_df.iloc[1, 1:].tolist()  # Extracting weighted max marks
+
+    # Create a dictionary for max marks per CO
+    max_marks = {co: max_mark for co, max_mark in zip(co_labels, weighted_max_marks)}
+
+    # Define expected proficiency thresholds based on the user-specified threshold or average method
+    if method == "threshold":
+        # Use threshold-based attainment
+        thresholds = {co: threshold * max_marks[co] for co in max_marks}
+        if report is not None:
+            report(f"Thresholds calculated: {thresholds}")
+    elif method == "average":
+        # Use average score of students for each CO as the threshold
+        student_marks_df = output_df.iloc[2:, 1:]  # Skip the first column with student names
+        student_marks_df.columns = co_labels  # Set column names to CO labels
+        thresholds = student_marks_df.mean().to_dict()  # Set thresholds to averages per CO
+        if report is not None:
+            report(f"Thresholds calculated: {thresholds}")
+    else:
+        raise ValueError("Invalid method. Choose either 'threshold' or 'average'.")
+
+    # Extract student marks rows, starting from row 2 (excluding headers)
+    student_marks_df = output_df.iloc[2:, 1:]  # Skip the first column with student names
+    student_marks_df.columns = co_labels  # Set column names to CO labels
+    total_students = len(student_marks_df)
+
+    # Count students who met or exceeded the expected proficiencies for each CO
+    results = {}
+    for co, min_score in thresholds.items():
+        results[co] = (student_marks_df[co] >= min_score).sum()
+
+    return attainment_summary(co_labels, results, total_students, attain_level_3_min,
+                              attain_level_2_min, attain_level_1_min, threshold, method)
+
+
+def attainment_from_marks(unique_cos, weighted_max_marks, marks, attain_level_3_min=80, attain_level_2_min=60,
+                          attain_level_1_min=50, threshold=0.6, method="threshold", report=None):
+    # compute_attainment_both_options on a (students x COs) float array of
+    # weighted marks instead of the processed frame
+    if method == "threshold":
+        thresholds = {co: threshold * weighted_max_marks[co] for co in unique_cos}
+    elif method == "average":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = (np.nanmean(marks, axis=0, dtype=np.float64) if len(marks)
+                     else np.full(len(unique_cos), np.nan))
+        thresholds = dict(zip(unique_cos, means.tolist()))
+    else:
+        raise ValueError("Invalid method. Choose either 'threshold' or 'average'.")
+    if report is not None:
+        report(f"Thresholds calculated: {thresholds}")
+
+    # Compared in the marks' own precision, so float32 marks that equal a
+    # threshold still count as meeting it
+    min_scores = np.array([thresholds[co] for co in unique_cos], dtype=np.float64).astype(marks.dtype)
+    met = (marks >= min_scores).sum(axis=0)
+    results = {co: met[k] for k, co in enumerate(unique_cos)}
+    return attainment_summary(unique_cos, results, len(marks), attain_level_3_min,
+                              attain_level_2_min, attain_level_1_min, threshold, method)
+
+
+def attainment_summary(co_labels, results, total_students, attain_level_3_min=80, attain_level_2_min=60,
+                       attain_level_1_min=50, threshold=0.6, method="threshold"):
+    # Summary table from per-CO counts of students meeting the expected proficiency
+    # Calculate Course Outcome attainment percentages
+    attainment_percentages = {co: (count / total_students) * 100 for co, count in results.items()}
+
+    # Determine CO attainment levels
+    attainment_levels = {}
+    for co, percentage in attainment_percentages.items():
+        if percentage >= attain_level_3_min:
+            attainment_levels[co] = 3
+        elif percentage >= attain_level_2_min:
+            attainment_levels[co] = 2
+        elif percentage >= attain_level_1_min:
+            attainment_levels[co] = 1
+        else:
+            attainment_levels[co] = 0
+
+    # Prepare a summary of outcomes
+    summary = {
+        'CO': co_labels,
+        'Expected Proficiency (%)': [threshold * 100 if method == "threshold" else "Average Score"] * len(co_labels),
+        'No of Students Scored Expected Marks': [results[co] for co in co_labels],
+        'Course Outcome Attainment (%)': [attainment_percentages[co] for co in co_labels],
+        'CO Attainment Level': [attainment_levels[co] for co in co_labels]
+    }
+
+    # Create a DataFrame for the summary
+    summary_df = pd.DataFrame(summary)
+
+    return summary_df
+
+
+def process_co_data_loop(df, co_weights, round_digits=2):
+    # Original per-student implementation, kept as the reference for
+    # process_co_data and for benchmark.py.
+    co_row = find_co_row(df)
+    if co_row is None:
+        raise ValueError("No CO labels found in the file")
+
+    headers = df.iloc[:co_row].values.tolist() if co_row > 0 else []
+    co_labels = df.iloc[co_row].tolist()
+    max_marks = df.iloc[co_row + 1].tolist()
+    student_marks = df.iloc[co_row + 2:].values.tolist()
+
+    unique_cos = sorted({col for col in co_labels if isinstance(col, str) and col.startswith('CO')},
+                        key=lambda x: int(x[2:]))
+
+    co_groups = {co: [] for co in unique_cos}
+    for co, max_mark in zip(co_labels, max_marks):
+        if co in co_groups:
+            co_groups[co].append(max_mark)
+
+    co_totals = {co: sum(marks) for co, marks in co_groups.items()}
+    total_co_marks = sum(co_totals.values())
+    weighted_max_marks = {co: total_co_marks * co_weights[co] for co in unique_cos}
+
+    processed_student_marks = []
+    for student in student_marks:
+        student_co_marks = {}
+        for co in unique_cos:
+            co_indices = [i for i, label in enumerate(co_labels) if label == co]
+            student_co_total = sum(student[i] for i in co_indices)
+            max_co_total = sum(co_groups[co])
+            student_co_marks[co] = round((student_co_total / max_co_total) * weighted_max_marks[co], round_digits)
+        processed_student_marks.append(student_co_marks)
+
+    output_data = headers + [
+        ["CO"] + unique_cos,
+        ["Weighted Max Marks"] + [weighted_max_marks.get(co, "") for co in unique_cos]
+    ]
+    for i, student in enumerate(processed_student_marks, start=1):
+        output_data.append([f"Student {i}"] + [student.get(co, "") for co in unique_cos])
+
+    return pd.DataFrame(output_data)
@@ -1,150 +1,84 @@
 
 import streamlit as st
 import pandas as pd
-import numpy as np
-import io
-import re
-import pandas as pd
-import re
 from streamlit_echarts import st_echarts
+import time
+import uuid
+import sqlite3
+from result_cache import shared_cache, content_hash, make_key
+from exports import export
+from group_attainment import grouped_attainment
+from job_queue import shared_queue, DONE, FAILED
+from pipeline import parse_upload, process_upload
+from profiling import Profiler
+from trend_store import TrendStore, course_and_term
+from table_view import PAGE_SIZES, page_bounds, page_count, processed_page, distribution_chart
 
 
-def compute_attainment_both_options(output_df, attain_level_3_min=80,attain_level_2_min=60,attain_level_1_min=50,threshold=0.6, method="threshold"):
-    # Extract the CO labels and weighted max marks from the output DataFrame
-    co_labels = output_df.iloc[0, 1:].tolist()  # Skipping the first column (CO label row)
-    weighted_max_marks = output_df.iloc[1, 1:].tolist()  # Extracting weighted max marks
-
-    # Create a dictionary for max marks per CO
-    max_marks = {co: max_mark for co, max_mark in zip(co_labels, weighted_max_marks)}
+def submit_job(owner, key, func, *args):
+    # shared_queue.submit, asking the user to retry when the server is too busy
+    try:
+        return shared_queue.submit(owner, key, func, *args)
+    except RuntimeError:
+        st.warning("The server is busy with other uploads. Please retry in a moment.")
+        st.stop()
 
-    # Define expected proficiency thresholds based on the user-specified threshold or average method
-    if method == "threshold":
-        # Use threshold-based attainment
-        thresholds = {co: threshold * max_marks[co] for co in max_marks}
-        st.write(f"Thresholds calculated: {thresholds}")
-    elif method == "average":
-        # Use average score of students for each CO as the threshold
-        student_marks_df = output_df.iloc[2:, 1:]  # Skip the first column with student names
-        student_marks_df.columns = co_labels  # Set column names to CO labels
-        thresholds = student_marks_df.mean().to_dict()  # Set thresholds to averages per CO
-        st.write(f"Thresholds calculated: {thresholds}")
-    else:
-        raise ValueError("Invalid method. Choose either 'threshold' or 'average'.")
 
-    # Extract student marks rows, starting from row 2 (excluding headers)
-    student_marks_df = output_df.iloc[2:, 1:]  # Skip the first column with student names
-    student_marks_df.columns = co_labels  # Set column names to CO labels
-    total_students = len(student_marks_df)
+def job_result(job, label, stage):
+    # Result of a background job. While it runs, show its progress and rerun
+    # the page shortly; the script thread itself never does the heavy work.
+    job.wait(0.25)  # quick jobs finish without a visible progress bar
+    if job.status == DONE:
+        # The job's stage timings are recorded on the run that receives its
+        # result only, so a rerun handed the same job doesn't count them again
+        if st.session_state.get(f"{stage}_job_id") != job.id:
+            st.session_state[f"{stage}_job_id"] = job.id
+            profiler.extend(job.result["profile"], stage)
+        return job.result
+    if job.status == FAILED:
+        st.error(f"Error: {job.error}")
+        st.stop()
+    st.progress(job.progress, text=job.message or label)
+    time.sleep(0.25)
+    st.rerun()
 
-    # Count students who met or exceeded the expected proficiencies for each CO
-    results = {}
-    for co, min_score in thresholds.items():
-        results[co] = (student_marks_df[co] >= min_score).sum()
 
-    # Calculate Course Outcome attainment percentages
-    attainment_percentages = {co: (count / total_students) * 100 for co, count in results.items()}
-
-    # Determine CO attainment levels
-    attainment_levels = {}
-    for co, percentage in attainment_percentages.items():
-        if percentage >= attain_level_3_min:
-            attainment_levels[co] = 3
-        elif percentage >= attain_level_2_min:
-            attainment_levels[co] = 2
-        elif percentage >= attain_level_1_min:
-            attainment_levels[co] = 1
-        else:
-            attainment_levels[co] = 0
+def download_buttons(kind, labels, df, file_stem, digest, **params):
+    # One button per format; a file is only built when its button is clicked
+    # and then kept in the shared cache. Downloading doesn't rerun the page.
+    for fmt, label in labels.items():
+        build, file_name, mime = export(kind, fmt, df, file_stem, digest, **params)
+        st.download_button(label=label, data=build, file_name=file_name, mime=mime, on_click="ignore")
 
-    # Prepare a summary of outcomes
-    summary = {
-        'CO': co_labels,
-        'Expected Proficiency (%)': [threshold * 100 if method == "threshold" else "Average Score"] * len(max_marks),
-        'No of Students Scored Expected Marks': [results[co] for co in co_labels],
-        'Course Outcome Attainment (%)': [attainment_percentages[co] for co in co_labels],
-        'CO Attainment Level': [attainment_levels[co] for co in co_labels]
-    }
 
-    # Create a DataFrame for the summary
-    summary_df = pd.DataFrame(summary)
-    
-    return summary_df
-
-   
-def process_co_data(df, co_weights, round_digits=2):
-    # Find the row with CO labels
-    co_row = None
-    for i, row in df.iterrows():
-        if any(co in str(cell) for co in ['CO1', 'CO2', 'CO3', 'CO4', 'CO5', 'CO6'] for cell in row):
-            co_row = i
-            break
-    
-    if co_row is None:
-        raise ValueError("No CO labels found in the file")
+def paged_table(key, total_rows, page_of):
+    # One page of a large table; only that slice is sent to the browser.
+    # page_of(start, stop) builds the rows to show.
+    col1, col2 = st.columns(2)
+    page_size = col1.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pages = page_count(total_rows, page_size)
+    # The page lives in session state only (no value= on the widget), so it
+    # can be clamped when a bigger page size leaves fewer pages
+    page_key = f"{key}_page"
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 1
+    elif st.session_state[page_key] > pages:
+        st.session_state[page_key] = pages
+    page = col2.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key=page_key)
+    start, stop = page_bounds(total_rows, page, page_size)
+    st.dataframe(page_of(start, stop))
+    st.caption(f"Rows {start + 1 if stop else 0}-{stop} of {total_rows}")
 
-    # Extract headers, CO labels, max marks, and student marks
-    headers = df.iloc[:co_row].values.tolist() if co_row > 0 else []
-    co_labels = df.iloc[co_row].tolist()
-    max_marks = df.iloc[co_row + 1].tolist()
-    student_marks = df.iloc[co_row + 2:].values.tolist()
-    
-    # Get unique CO components while maintaining order
-    # Get unique CO components and sort them in 'CO1', 'CO2', etc. order
-    unique_cos = sorted({col for col in co_labels if isinstance(col, str) and col.startswith('CO')},
-                        key=lambda x: int(x[2:]))  # Sort by numeric part of CO labels
-    
-    #unique_cos = []
-    #seen = set()
-    #for co in co_labels:
-     #   if isinstance(co, str) and co.startswith('CO') and co not in seen:
-      #      unique_cos.append(co)
-       #     seen.add(co)
-    
-    # Group COs and their corresponding marks
-    co_groups = {co: [] for co in unique_cos}
-    for co, max_mark in zip(co_labels, max_marks):
-        if co in co_groups:
-            co_groups[co].append(max_mark)
-    
-    # Calculate total marks for each CO group
-    co_totals = {co: sum(marks) for co, marks in co_groups.items()}
-    
-    # Calculate total of all CO marks
-    total_co_marks = sum(co_totals.values())
-    
-    # Calculate weighted max marks for each CO (without rounding)
-    weighted_max_marks = {co: total_co_marks * co_weights[co] for co in unique_cos}
-    
-    # Process student marks
-    processed_student_marks = []
-    for student in student_marks:
-        student_co_marks = {}
-        for co in unique_cos:
-            co_indices = [i for i, label in enumerate(co_labels) if label == co]
-            student_co_total = sum(student[i] for i in co_indices)
-            max_co_total = sum(co_groups[co])
-            # Round only the student marks
-            student_co_marks[co] = round((student_co_total / max_co_total) * weighted_max_marks[co], round_digits)
-        processed_student_marks.append(student_co_marks)
-    
-    # Prepare output data with unique CO labels
-    output_data = headers + [
-        ["CO"] + unique_cos,
-        ["Weighted Max Marks"] + [weighted_max_marks.get(co, "") for co in unique_cos]
-    ]
-    for i, student in enumerate(processed_student_marks, start=1):
-        output_data.append([f"Student {i}"] + [student.get(co, "") for co in unique_cos])
-    
-    # Create output DataFrame
-    output_df = pd.DataFrame(output_data)
-    
-    return output_df
 
 # Initialize session state variables
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Stage timings for this run, shown in the optional diagnostics panel
+profiler = Profiler()
+show_diagnostics = st.sidebar.checkbox("Show diagnostics")
 if 'processed' not in st.session_state:
     st.session_state.processed = False
-if 'output_df' not in st.session_state:
-    st.session_state.output_df = None
 if 'summary_df' not in st.session_state:
     st.session_state.summary_df = None
 # Create the data for the DataFrame
@@ -168,12 +102,27 @@ st.write(sample_df)
 uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
 
 if uploaded_file is not None:
-    # Read the Excel file
-    df = pd.read_excel(uploaded_file, header=None)
+    # Read the Excel file in the background (parsed once per distinct upload,
+    # shared across reruns and sessions). A new upload cancels the previous
+    # file's jobs if nobody else is waiting for them.
+    file_bytes = uploaded_file.getvalue()
+    file_hash = content_hash(file_bytes)
+    session_id = st.session_state.session_id
+    if st.session_state.get('file_hash') != file_hash:
+        shared_queue.release((session_id, "process"))
+        st.session_state.file_hash = file_hash
+    parsed = job_result(
+        submit_job((session_id, "parse"), make_key("parse", file_hash), parse_upload, file_bytes, file_hash),
+        "Reading workbook",
+        "parse"
+    )
+    df = parsed["df"]
     
-    # Display input data
+    # Display input data, a page at a time, with statistics per column
     st.subheader("Input Data")
-    st.dataframe(df)
+    paged_table("input", len(df), lambda start, stop: df.iloc[start:stop])
+    with st.expander("Column statistics"):
+        st.dataframe(parsed["stats"])
     attain_level_3_min = st.number_input(
                         "Enter minimum value for Attainment Level 3:",
                         min_value=0,
@@ -193,11 +142,12 @@ if uploaded_file is not None:
                         value=50
                     )
     # Find CO labels
-    co_row = next((i for i, row in df.iterrows() if any(co in str(cell) for co in ['CO1', 'CO2', 'CO3', 'CO4', 'CO5', 'CO6'] for cell in row)), None)
+    co_row = parsed["co_row"]
     if co_row is None:
         st.error("No CO labels found in the file")
     else:
-        co_labels = list({col for col in df.iloc[co_row] if isinstance(col, str) and col.startswith('CO')})
+        # CO columns were indexed once when the file was parsed
+        co_labels = parsed["aggregates"].unique_cos
 
         # Create input fields for CO weights
         #st.write(f"The list of CO labels are {co_labels}")
@@ -220,26 +170,43 @@ if uploaded_file is not None:
             st.warning(f"The sum of weights is {total_weight:.2f}. It should be 1.0.")
         else:
             if st.button("Process Data") or st.session_state.processed:
-                # Process the data
-                st.session_state.output_df = process_co_data(df, co_weights, round_digits)
+                # Process the data. The per-student CO totals don't depend on
+                # weights or thresholds, so they are computed once per file and
+                # every later change only rescales them. Changing a parameter
+                # mid-run cancels the outdated job.
                 st.session_state.processed = True
+                aggregates = parsed["aggregates"]
+                process_params = dict(co_weights=co_weights, round_digits=round_digits)
+                processed = job_result(
+                    submit_job(
+                        (session_id, "process"),
+                        make_key("process", file_hash, **process_params),
+                        process_upload, file_hash, aggregates, co_weights, round_digits
+                    ),
+                    "Processing marks",
+                    "process"
+                )
+                score_index = processed["score_index"]
                 
-                # Display output data
+                # Display output data: per-CO statistics and a page of students
                 st.subheader("Processed Data")
                 st.write("Download Scaled Marks for Each CO")
-                st.dataframe(st.session_state.output_df)
-                
-                # Provide download link for processed data
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    st.session_state.output_df.to_excel(writer, index=False, header=False)
-                output.seek(0)
+                st.dataframe(processed["stats"])
+                paged_table(
+                    "processed",
+                    score_index.total_students,
+                    lambda start, stop: processed_page(processed["processed"], start, stop)
+                )
                 
-                st.download_button(
-                    label="Download Processed Data",
-                    data=output,
-                    file_name="processed_co_data.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                # Provide download links for processed data
+                download_buttons(
+                    "processed",
+                    {
+                        "xlsx": "Download Processed Data",
+                        "csv.zip": "Download Processed Data (CSV, zipped)",
+                        "parquet": "Download Processed Data (Parquet)",
+                    },
+                    processed["processed"], "processed_co_data", file_hash, **process_params
                 )
 
                 # Attainment calculation section
@@ -258,17 +225,37 @@ if uploaded_file is not None:
                         value=0.60
                     )
 
+                # Optional breakdown by the identity columns bound to each student
+                group_by = []
+                if len(aggregates.identity.columns):
+                    group_by = st.multiselect(
+                        "Break attainment down by (e.g. section, batch, campus):",
+                        list(aggregates.identity.columns)
+                    )
+
+                # Calculations can be saved to the attainment history by course
+                # and term (defaults come from the sheet's header rows) and
+                # compared across terms below
+                default_course, default_term = course_and_term(aggregates.headers)
+                col1, col2 = st.columns(2)
+                course = col1.text_input("Course", value=default_course, key="course")
+                term = col2.text_input("Term", value=default_term, key="term")
+                save_to_history = st.checkbox("Save calculated attainment to the history")
+
+                # score_index holds sorted per-CO scores: any threshold or level
+                # cutoff is a binary search
                 # Compute attainment based on user selection
                 if st.button("Calculate Attainment"):
                     try:
-                        summary_df = compute_attainment_both_options(
-                            st.session_state.output_df,                                                       
-                            attain_level_3_min,
-                            attain_level_2_min,
-                            attain_level_1_min,
-                            threshold=threshold, 
-                            method=method.lower()
-                        )
+                        with profiler.stage("attainment", score_index.total_students, len(score_index.unique_cos)):
+                            summary_df = score_index.summary(
+                                attain_level_3_min,
+                                attain_level_2_min,
+                                attain_level_1_min,
+                                threshold=threshold,
+                                method=method.lower(),
+                                report=st.write
+                            )
                        
                         
                         # Display the summary DataFrame
@@ -277,29 +264,80 @@ if uploaded_file is not None:
                                                 
                         st.dataframe(summary_df)
 
-                        # Download the summary as an Excel file
-                        buffer = io.BytesIO()
-                        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                            summary_df.to_excel(writer, index=False, sheet_name='Summary')
-                        buffer.seek(0)  # Move to the beginning of the BytesIO buffer
-
-                        st.download_button(
-                            label="Download Summary as Excel",
-                            data=buffer,
-                            file_name="course_outcome_summary.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        # Download the summary
+                        download_buttons(
+                            "summary",
+                            {
+                                "xlsx": "Download Summary as Excel",
+                                "csv.zip": "Download Summary as CSV (zipped)",
+                                "parquet": "Download Summary as Parquet",
+                            },
+                            summary_df, "course_outcome_summary", file_hash, **process_params,
+                            levels=(attain_level_3_min, attain_level_2_min, attain_level_1_min),
+                            threshold=threshold, method=method.lower()
                         )
                         st.session_state.summary_df = summary_df
-                        
+
+                        if save_to_history:
+                            try:
+                                TrendStore().save_run(
+                                    course, term, summary_df,
+                                    method=method.lower(),
+                                    threshold=threshold,
+                                    levels=(attain_level_3_min, attain_level_2_min, attain_level_1_min),
+                                    score_index=score_index,
+                                    file_hash=file_hash,
+                                    source="raw",
+                                    params=process_params
+                                )
+                                st.success(f"Saved to the attainment history as {course}, {term}")
+                            except sqlite3.Error as e:
+                                st.error(f"Error saving to the attainment history: {e}")
+
+                        if group_by:
+                            st.write(f"### Attainment by {', '.join(group_by)}")
+                            st.dataframe(grouped_attainment(
+                                aggregates,
+                                co_weights,
+                                group_by,
+                                round_digits,
+                                attain_level_3_min,
+                                attain_level_2_min,
+                                attain_level_1_min,
+                                threshold=threshold,
+                                method=method.lower()
+                            ))
+
                     except ValueError as e:
                         st.error(f"Error: {e}")
+                if st.button("Draw Attainment Curve"):
+                    # Attainment (%) of every CO across 0-100% proficiency thresholds
+                    curve_df = score_index.attainment_curve()
+                    options = {
+                        "title": {"text": "CO Attainment vs Proficiency Threshold", "left": "center"},
+                        "tooltip": {"trigger": "axis"},
+                        "legend": {"data": list(curve_df.columns), "top": "10%"},
+                        "xAxis": {
+                            "type": "category",
+                            "data": [f"{t:g}" for t in curve_df.index],
+                            "name": "Threshold (%)",
+                        },
+                        "yAxis": {"type": "value", "name": "Attainment (%)", "max": 100},
+                        "series": [
+                            {"name": co, "type": "line", "showSymbol": False, "data": curve_df[co].round(2).tolist()}
+                            for co in curve_df.columns
+                        ],
+                    }
+                    st_echarts(options=options, height="400px")
+                # Students per score band of one CO, counted from the score
+                # index: the chart has the same few bars for any class size
+                distribution_co = st.selectbox("CO for the score distribution", score_index.unique_cos)
+                if st.button("Draw Score Distribution"):
+                    distribution = score_index.distribution()
+                    st_echarts(options=distribution_chart(distribution, distribution_co), height="400px")
                 if st.button("Draw Histogram"):
                     try:
                         df = st.session_state.summary_df                                                       
-                         
-                        st.write("### Data Preview")
-                        
-                        st.dataframe(df)
                         
                         # Prepare data for ECharts
                         categories = df["CO"].tolist()
@@ -345,6 +383,22 @@ if uploaded_file is not None:
                     except ValueError as e:
                         st.error(f"Error: {e}")    
 
+# Saved attainment history: per-CO trend across terms and the level
+# histogram of any saved term, read from the store without recomputing
+try:
+    trend_store = TrendStore()
+    history_courses = trend_store.courses() if trend_store.exists() else []
+    if history_courses:
+        st.subheader("Attainment History")
+        history_course = st.selectbox("Course", history_courses, key="history_course")
+        st.dataframe(trend_store.trend(history_course))
+        st_echarts(options=trend_store.trend_chart(history_course), height="400px")
+        history_terms = trend_store.terms(history_course)
+        history_term = st.selectbox("Term", history_terms, index=len(history_terms) - 1, key="history_term")
+        st_echarts(options=trend_store.histogram_chart(history_course, history_term), height="400px")
+except (sqlite3.Error, ValueError) as e:
+    st.error(f"Error reading the attainment history: {e}")
+
 st.markdown("""
 ### Instructions:
 1. Upload an Excel file containing CO data.
@@ -352,5 +406,21 @@ st.markdown("""
 3. Enter the Attainment Level Percentages and then enter the weightage for each CO component. The sum of all weights should be 1.
 4. Specify the number of decimal places for rounding student marks.
 5. Click 'Process Data' to see the results.
-6. You can download the processed data as an Excel file.
+6. You can download the processed data as an Excel file, a zipped CSV (fastest for large classes) or Parquet.
 """)
+
+if show_diagnostics:
+    # Timings of this run only: a background job's stages appear on the run
+    # that received its result, and stages served from the shared cache show
+    # up with near-zero times
+    st.sidebar.subheader("Diagnostics")
+    st.sidebar.write(f"Total: {profiler.total_seconds:.3f} s")
+    st.sidebar.dataframe(profiler.to_frame(), hide_index=True)
+    st.sidebar.write(f"Cache: {len(shared_cache)} entries, {shared_cache.nbytes / 2**20:.1f} MiB, "
+                     f"{shared_cache.hits} hits / {shared_cache.misses} misses")
+    st.sidebar.download_button(
+        label="Download diagnostics (JSON)",
+        data=profiler.to_json(indent=2),
+        file_name="co_attainment_profile.json",
+        mime="application/json"
+    )
@@ -0,0 +1,201 @@
+import json
+import math
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from co_processing import ProcessedMarks
+
+# Parquet and Arrow IPC storage for the processed CO marks table and the
+# attainment summary. Student marks become typed float columns; the rows
+# process_co_data keeps around them (headers, CO labels, weighted max marks)
+# travel in the schema metadata so the legacy frame can be rebuilt exactly.
+# Arrow IPC files can be memory-mapped by downstream jobs.
+
+METADATA_KEY = b"coattainment"
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def columnar_format(path):
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return "parquet"
+    if extension in ARROW_EXTENSIONS:
+        return "arrow"
+    raise ValueError(f"Unsupported columnar file extension: {extension or path}")
+
+
+def _jsonable(value):
+    # Header cells come straight from Excel: keep numbers and strings, store
+    # empty cells (None, NaN) as null so the metadata stays strict JSON, and
+    # stringify anything else (dates, times)
+    if hasattr(value, "item"):
+        value = value.item()
+    if value is None or isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+def _from_json(value):
+    # Inverse of _jsonable for empty cells: null reads back as NaN
+    return np.nan if value is None else value
+
+
+def _processed_metadata(headers, unique_cos, weighted_max_marks):
+    return {
+        METADATA_KEY: json.dumps({
+            "kind": "processed_co_marks",
+            "headers": [[_jsonable(cell) for cell in row] for row in headers],
+            "co_labels": list(unique_cos),
+            "weighted_max_marks": [_jsonable(v) for v in weighted_max_marks],
+        }, allow_nan=False).encode()
+    }
+
+
+def _processed_schema(headers, unique_cos, weighted_max_marks, value_type=pa.float64()):
+    fields = [pa.field("Student", pa.string())] + [pa.field(co, value_type) for co in unique_cos]
+    return pa.schema(fields, metadata=_processed_metadata(headers, unique_cos, weighted_max_marks))
+
+
+def processed_to_table(processed):
+    # Student columns + metadata from ProcessedMarks (or a legacy
+    # process_co_data frame). Each CO column of the score array is
+    # contiguous, so float64 marks go to Arrow without a copy.
+    if not isinstance(processed, ProcessedMarks):
+        processed = ProcessedMarks.from_frame(processed)
+    value_type = pa.from_numpy_dtype(processed.marks.dtype)
+    schema = _processed_schema(processed.headers, processed.unique_cos,
+                               processed.cos["weighted_max_marks"].tolist(), value_type)
+    arrays = [pa.array([str(student) for student in processed.student_ids.tolist()], type=pa.string())]
+    arrays += [pa.array(processed.marks[:, k], type=value_type) for k in range(len(processed.cos))]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def table_to_marks(table):
+    # Inverse of processed_to_table, as ProcessedMarks
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+    if metadata.get("kind") != "processed_co_marks":
+        raise ValueError("Not a processed CO marks table")
+    unique_cos = metadata["co_labels"]
+    columns = [table.column(co).to_numpy() for co in unique_cos]
+    marks = np.column_stack(columns) if columns else np.empty((table.num_rows, 0))
+    dtype = marks.dtype if marks.dtype in (np.float32, np.float64) else np.float64
+    weighted_max_marks = [_from_json(v) for v in metadata["weighted_max_marks"]]
+    headers = [[_from_json(cell) for cell in row] for row in metadata["headers"]]
+    return ProcessedMarks(marks, unique_cos, weighted_max_marks, table.column("Student").to_pylist(),
+                          headers, dtype=dtype)
+
+
+def table_to_processed(table):
+    # Inverse of processed_to_table: rebuild the process_co_data frame
+    return table_to_marks(table).to_frame()
+
+
+def summary_to_table(summary_df):
+    table = pa.Table.from_pandas(summary_df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({"kind": "attainment_summary"}).encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def write_table(table, path):
+    if columnar_format(path) == "parquet":
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(str(path), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_table(path, memory_map=True):
+    if columnar_format(path) == "parquet":
+        return pq.read_table(path, memory_map=memory_map)
+    source = pa.memory_map(str(path)) if memory_map else pa.OSFile(str(path))
+    return ipc.open_file(source).read_all()
+
+
+def table_to_bytes(table, fmt):
+    sink = pa.BufferOutputStream()
+    if fmt == "parquet":
+        pq.write_table(table, sink)
+    else:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class ProcessedWriter:
+    # Appends blocks of weighted marks to a processed CO marks file, for
+    # producing one larger than memory. The result reads back with
+    # read_processed like a file written by write_processed.
+
+    def __init__(self, path, headers, unique_cos, weighted_max_marks):
+        self.unique_cos = list(unique_cos)
+        self.schema = _processed_schema(headers, self.unique_cos, weighted_max_marks)
+        self.rows = 0
+        self._sink = None
+        if columnar_format(path) == "parquet":
+            self._writer = pq.ParquetWriter(str(path), self.schema)
+        else:
+            self._sink = pa.OSFile(str(path), "wb")
+            self._writer = ipc.new_file(self._sink, self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, marks):
+        # marks: (students x COs) float array, students numbered on from the last block
+        students = [f"Student {i}" for i in range(self.rows + 1, self.rows + len(marks) + 1)]
+        arrays = [pa.array(students, type=pa.string())]
+        arrays += [pa.array(marks[:, k], type=pa.float64()) for k in range(len(self.unique_cos))]
+        batch = pa.record_batch(arrays, schema=self.schema)
+        self._writer.write_batch(batch)
+        self.rows += len(marks)
+
+    def close(self):
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+
+def iter_processed_marks(path):
+    # (students x COs) float blocks of a processed CO marks file, one record
+    # batch (Arrow) or row group (Parquet) at a time
+    if columnar_format(path) == "parquet":
+        parquet_file = pq.ParquetFile(str(path))
+        unique_cos = json.loads(parquet_file.schema_arrow.metadata[METADATA_KEY])["co_labels"]
+        batches = parquet_file.iter_batches(columns=unique_cos)
+    else:
+        reader = ipc.open_file(pa.memory_map(str(path)))
+        unique_cos = json.loads(reader.schema.metadata[METADATA_KEY])["co_labels"]
+        batches = (reader.get_batch(i).select(unique_cos) for i in range(reader.num_record_batches))
+    for batch in batches:
+        yield np.column_stack([batch.column(k).to_numpy(zero_copy_only=False) for k in range(len(unique_cos))])
+
+
+def write_processed(output_df, path):
+    write_table(processed_to_table(output_df), path)
+
+
+def read_processed(path, memory_map=True):
+    return table_to_processed(read_table(path, memory_map))
+
+
+def read_marks(path, memory_map=True):
+    return table_to_marks(read_table(path, memory_map))
+
+
+def write_summary(summary_df, path):
+    write_table(summary_to_table(summary_df), path)
+
+
+def read_summary(path, memory_map=True):
+    return read_table(path, memory_map).to_pandas()
@@ -0,0 +1,175 @@
+import csv
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from co_processing import ProcessedMarks
+from columnar_io import processed_to_table, summary_to_table, table_to_bytes
+from result_cache import shared_cache, make_key
+
+# Download files for the processed marks and the attainment summary.
+#
+# Excel files are written row by row with xlsxwriter's constant_memory mode,
+# which flushes each row to disk as soon as the next one starts instead of
+# holding every cell object like openpyxl (or pandas' ExcelFormatter) does.
+# For very large cohorts a ZIP-compressed CSV is much faster still.
+#
+# Nothing is built up front: export() returns a zero-argument callable that
+# st.download_button only runs when the user clicks, and the bytes it builds
+# are kept in the shared result cache under the same parameters as the data
+# they came from, so a repeated download (or another session) reuses them.
+
+FORMATS = {
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv.zip": (".csv.zip", "application/zip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+CSV_CHUNK_ROWS = 50000
+
+
+def _column_values(series):
+    # Python values for one column, with missing cells as None (blank in Excel)
+    values = series.tolist()
+    if series.hasnans:
+        missing = series.isna().to_numpy()
+        values = [None if m else v for v, m in zip(values, missing)]
+    return values
+
+
+def _missing_as_none(values):
+    return [None if value is None or (isinstance(value, float) and value != value) else value for value in values]
+
+
+def _new_workbook(output):
+    return xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+
+
+def frame_to_xlsx(df, header=True, sheet_name="Sheet1"):
+    output = io.BytesIO()
+    workbook = _new_workbook(output)
+    worksheet = workbook.add_worksheet(sheet_name)
+    row = 0
+    if header:
+        # Same look as pandas' to_excel header
+        header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        worksheet.write_row(0, 0, [str(column) for column in df.columns], header_format)
+        row = 1
+    columns = [_column_values(df.iloc[:, k]) for k in range(df.shape[1])]
+    for values in zip(*columns):
+        worksheet.write_row(row, 0, values)
+        row += 1
+    workbook.close()
+    return output.getvalue()
+
+
+def frame_to_csv_zip(df, file_name, header=True):
+    # CSV written straight into a deflated ZIP member, a chunk of rows at a time
+    return _csv_zip(file_name, lambda text: _write_csv_chunks(df, text, header))
+
+
+def _csv_zip(file_name, write):
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(file_name, "w") as member:
+            text = io.TextIOWrapper(member, encoding="utf-8", newline="")
+            write(text)
+            text.flush()
+            text.detach()
+    return output.getvalue()
+
+
+def _write_csv_chunks(df, text, header=False):
+    for start in range(0, max(len(df), 1), CSV_CHUNK_ROWS):
+        df.iloc[start:start + CSV_CHUNK_ROWS].to_csv(
+            text, index=False, header=header and start == 0, quoting=csv.QUOTE_MINIMAL
+        )
+
+
+def _processed_layout(processed):
+    # Rows above the students in process_co_data's layout, and its width
+    head = [list(row) for row in processed.headers] + [
+        ["CO"] + processed.unique_cos,
+        ["Weighted Max Marks"] + processed.cos["weighted_max_marks"].tolist()
+    ]
+    return head, max(len(row) for row in head)
+
+
+def processed_to_xlsx(processed):
+    # ProcessedMarks are written straight from their arrays; a legacy
+    # process_co_data frame goes through frame_to_xlsx
+    if not isinstance(processed, ProcessedMarks):
+        return frame_to_xlsx(processed, header=False)
+    output = io.BytesIO()
+    workbook = _new_workbook(output)
+    worksheet = workbook.add_worksheet("Sheet1")
+    head, _ = _processed_layout(processed)
+    for row, values in enumerate(head):
+        worksheet.write_row(row, 0, _missing_as_none(values))
+    missing = np.isnan(processed.marks).any(axis=1).tolist()
+    for row, (student, marks, has_missing) in enumerate(
+            zip(processed.student_ids.tolist(), processed.marks_list(), missing), start=len(head)):
+        worksheet.write(row, 0, student)
+        worksheet.write_row(row, 1, _missing_as_none(marks) if has_missing else marks)
+    workbook.close()
+    return output.getvalue()
+
+
+def processed_to_csv_zip(processed, file_name):
+    # Same text as frame_to_csv_zip on the legacy frame, but student rows
+    # are formatted from the typed score array
+    if not isinstance(processed, ProcessedMarks):
+        return frame_to_csv_zip(processed, file_name, header=False)
+    head, width = _processed_layout(processed)
+
+    def write(text):
+        _write_csv_chunks(pd.DataFrame([row + [None] * (width - len(row)) for row in head]), text)
+        marks = processed.marks
+        for start in range(0, len(marks), CSV_CHUNK_ROWS):
+            block = pd.DataFrame(np.asarray(marks[start:start + CSV_CHUNK_ROWS], dtype=np.float64),
+                                 columns=range(1, marks.shape[1] + 1))
+            if marks.dtype != np.float64 and processed.round_digits is not None:
+                block = block.round(processed.round_digits)
+            block.insert(0, 0, processed.student_ids[start:start + CSV_CHUNK_ROWS])
+            for k in range(marks.shape[1] + 1, width):
+                block[k] = None
+            block.to_csv(text, index=False, header=False, quoting=csv.QUOTE_MINIMAL)
+    return _csv_zip(file_name, write)
+
+
+def summary_to_xlsx(summary_df):
+    return frame_to_xlsx(summary_df, sheet_name="Summary")
+
+
+def build_export(kind, fmt, df, file_stem):
+    # kind: "processed" (ProcessedMarks or process_co_data's headerless
+    # layout) or "summary"
+    processed = kind == "processed"
+    if fmt == "xlsx":
+        return processed_to_xlsx(df) if processed else summary_to_xlsx(df)
+    if fmt == "csv.zip":
+        if processed:
+            return processed_to_csv_zip(df, f"{file_stem}.csv")
+        return frame_to_csv_zip(df, f"{file_stem}.csv")
+    if fmt == "parquet":
+        return table_to_bytes(processed_to_table(df) if processed else summary_to_table(df), "parquet")
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+
+def export(kind, fmt, df, file_stem, digest, **params):
+    # Returns (build, file_name, mime). build() produces the file's bytes on
+    # first use and serves them from the shared cache afterwards.
+    extension, mime = FORMATS[fmt]
+    key = make_key(f"{kind}_{fmt}", digest, **params)
+
+    def build():
+        return shared_cache.get_or_compute(key, lambda: build_export(kind, fmt, df, file_stem))
+    return build, file_stem + extension, mime
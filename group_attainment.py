@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+# Grouped CO attainment (by section, batch, campus, program, ...) and the
+# roll-up to program outcomes. Students are bound to their identity columns
+# by CoAggregates; here every group's counts come out of one hash group-by
+# pass over the weighted marks instead of re-running the pipeline per subset.
+
+SOURCE_COLUMN = "Source"
+
+
+def _stack(aggregates, co_weights, round_digits, threshold, method):
+    # Weighted marks, per-student proficiency thresholds and identity rows of
+    # one or several sheets, aligned on the union of their COs. Each sheet
+    # keeps its own scale: the threshold method uses its weighted max marks,
+    # the average method its own class average.
+    if isinstance(aggregates, dict):
+        sources = list(aggregates.items())
+    else:
+        sources = [(None, aggregates)]
+    unique_cos = sorted({co for _, agg in sources for co in agg.unique_cos}, key=lambda x: int(x[2:]))
+    position = {co: k for k, co in enumerate(unique_cos)}
+
+    marks_blocks, min_score_blocks, assessed_blocks, identity_blocks = [], [], [], []
+    for name, agg in sources:
+        n = len(agg.fractions)
+        columns = [position[co] for co in agg.unique_cos]
+        marks = np.full((n, len(unique_cos)), np.nan)
+        marks[:, columns] = agg.weighted_marks(co_weights, round_digits)
+        min_scores = np.full(len(unique_cos), np.nan)
+        if method == "threshold":
+            weighted_max_marks = agg.scaling.weighted_max_marks(co_weights)
+            min_scores[columns] = [threshold * weighted_max_marks[co] for co in agg.unique_cos]
+        elif method == "average":
+            # Class average skipping missing marks, NaN for a CO nobody has
+            # marks in (np.nanmean would warn about that)
+            valid = ~np.isnan(marks)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                min_scores = np.where(valid, marks, 0.0).sum(axis=0) / valid.sum(axis=0)
+        else:
+            raise ValueError("Invalid method. Choose either 'threshold' or 'average'.")
+        identity = agg.identity
+        if name is not None:
+            identity = identity.assign(**{SOURCE_COLUMN: name})
+        assessed = np.zeros(len(unique_cos), dtype=bool)
+        assessed[columns] = True
+        marks_blocks.append(marks)
+        min_score_blocks.append(np.broadcast_to(min_scores, marks.shape))
+        assessed_blocks.append(np.broadcast_to(assessed, marks.shape))
+        identity_blocks.append(identity)
+    return (unique_cos, np.vstack(marks_blocks), np.vstack(min_score_blocks), np.vstack(assessed_blocks),
+            pd.concat(identity_blocks, ignore_index=True))
+
+
+def attainment_levels(percentages, attain_level_3_min=80, attain_level_2_min=60, attain_level_1_min=50):
+    # Vectorised version of the level rule in attainment_summary
+    return np.select(
+        [percentages >= attain_level_3_min, percentages >= attain_level_2_min, percentages >= attain_level_1_min],
+        [3, 2, 1],
+        default=0
+    )
+
+
+def grouped_attainment(aggregates, co_weights, by, round_digits=2, attain_level_3_min=80, attain_level_2_min=60,
+                       attain_level_1_min=50, threshold=0.6, method="threshold"):
+    # aggregates: a CoAggregates, or {source name: CoAggregates} to pool
+    # several sheets (the name is available as the "Source" column).
+    # by: identity column name(s) to group on.
+    # Returns one row per group and CO with the summary table's columns.
+    by = [by] if isinstance(by, str) else list(by)
+    unique_cos, marks, min_scores, assessed, identity = _stack(aggregates, co_weights, round_digits, threshold, method)
+    missing = [column for column in by if column not in identity.columns]
+    if missing:
+        raise ValueError(f"Unknown grouping columns: {', '.join(missing)}")
+
+    # Hash group-by: one integer code per student
+    grouper = identity.groupby(by, sort=True, dropna=False)
+    codes = grouper.ngroup().to_numpy()
+    keys = grouper.size().index
+    n_groups = len(keys)
+
+    met = marks >= min_scores
+    n_cos = len(unique_cos)
+    counts = np.column_stack([np.bincount(codes, weights=met[:, k], minlength=n_groups)
+                              for k in range(n_cos)]).astype(np.int64)
+    # Each CO is out of the group's students whose sheet assesses it, so
+    # pooling a sheet without the CO doesn't dilute its attainment
+    students = np.column_stack([np.bincount(codes, weights=assessed[:, k], minlength=n_groups)
+                                for k in range(n_cos)]).astype(np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percentages = counts / students * 100
+    levels = attainment_levels(percentages, attain_level_3_min, attain_level_2_min, attain_level_1_min)
+
+    key_frame = keys.to_frame(index=False) if isinstance(keys, pd.MultiIndex) else pd.DataFrame({by[0]: keys})
+    summary_df = key_frame.loc[key_frame.index.repeat(n_cos)].reset_index(drop=True)
+    summary_df['Students'] = students.ravel()
+    summary_df['CO'] = np.tile(unique_cos, n_groups)
+    summary_df['Expected Proficiency (%)'] = threshold * 100 if method == "threshold" else "Average Score"
+    summary_df['No of Students Scored Expected Marks'] = counts.ravel()
+    summary_df['Course Outcome Attainment (%)'] = percentages.ravel()
+    summary_df['CO Attainment Level'] = levels.ravel()
+    # COs a group's sheets don't assess are left out rather than reported as 0
+    if not assessed.all():
+        summary_df = summary_df[students.ravel() > 0].reset_index(drop=True)
+    return summary_df
+
+
+def program_outcome_attainment(summary_df, co_po_mapping, by=()):
+    # Roll CO attainment levels up to program outcomes. co_po_mapping is the
+    # articulation matrix {PO: {CO: strength}}; each PO's attainment is the
+    # strength-weighted mean level of the COs mapped to it that were assessed.
+    by = [by] if isinstance(by, str) else list(by)
+    if by:
+        levels = summary_df.pivot_table(index=by, columns='CO', values='CO Attainment Level', aggfunc='mean')
+    else:
+        levels = summary_df.groupby('CO')['CO Attainment Level'].mean().to_frame().T
+    pos = list(co_po_mapping)
+    mapping = np.array([[co_po_mapping[po].get(co, 0) for po in pos] for co in levels.columns], dtype=np.float64)
+    values = levels.to_numpy(dtype=np.float64)
+    assessed = ~np.isnan(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        attainment = (np.where(assessed, values, 0.0) @ mapping) / (assessed.astype(np.float64) @ mapping)
+    result = pd.DataFrame(attainment, index=levels.index, columns=pos)
+    return result.reset_index() if by else result.reset_index(drop=True)
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from co_columns import header_max_marks
+from score_index import ScoreIndex
+
+# Attainment for the header-style layout used by streamlit_app.py: one row
+# per student and one column per CO, with the CO's max marks in its header,
+# e.g. "CO1 (30)". Kept free of streamlit so other entry points can use it.
+
+
+# Function to process the uploaded Excel file
+def process_file(uploaded_file, threshold, report=None):
+    # Load data from the uploaded Excel file
+    df = pd.read_excel(uploaded_file)
+
+    # Extract maximum marks for each CO from the column headers, e.g. "CO1 (30)"
+    max_marks, skipped = header_max_marks(df.columns)
+    if skipped and report is not None:
+        report(f"Ignored columns that are not CO labels like \"CO1 (30)\": {', '.join(skipped)}")
+
+    # Define expected proficiency thresholds based on user input
+    thresholds = {co: threshold * max_marks[co] for co in max_marks}
+
+    # Count number of students
+    total_students = len(df)
+
+    # Count students who met or exceeded expected proficiencies
+    score_index = ScoreIndex.from_frame(df, max_marks)
+    counts = score_index.counts_at_least([thresholds[co] for co in max_marks])
+    results = {co: counts[k] for k, co in enumerate(max_marks)}
+
+    # Calculate Course Outcome attainment percentages
+    attainment_percentages = {co: (count / total_students) * 100 for co, count in results.items()}
+
+    # Determine CO attainment levels
+    attainment_levels = {}
+    for co, percentage in attainment_percentages.items():
+        if percentage >= 80:
+            attainment_levels[co] = 3
+        elif percentage >= 70:
+            attainment_levels[co] = 2
+        else:
+            attainment_levels[co] = 1
+
+    # Summary of outcomes
+    summary = {
+        'CO': list(max_marks.keys()),
+        'Expected Proficiency (%)': [threshold * 100] * len(max_marks),
+        'No of Students Scored Expected Marks': [results[co] for co in max_marks],
+        'Course Outcome Attainment (%)': [attainment_percentages[co] for co in max_marks],
+        'CO Attainment Level': [attainment_levels[co] for co in max_marks]
+    }
+
+    # Create a DataFrame for summary
+    summary_df = pd.DataFrame(summary)
+
+    return summary_df
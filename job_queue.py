@@ -0,0 +1,168 @@
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from result_cache import estimate_size
+
+# In-process job scheduler so long computations run on a bounded worker pool
+# instead of the Streamlit script thread. Jobs are keyed like result_cache
+# entries: submitting a key that is already queued or running joins that job,
+# so users uploading the same workbook share one computation. Each owner (a
+# browser session) follows one job at a time; moving to a new key withdraws
+# it from the old job, which is cancelled once nobody is waiting for it.
+# A finished job stays with its owners until they move to another key or are
+# released, so reruns asking for the same key get the result back without
+# recomputing it, even when it was too large for the shared result cache.
+# Results kept that way share a byte budget; the least recently used owners
+# lose theirs first, so closed sessions can't pin old results for long.
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+DEFAULT_MAX_FINISHED_BYTES = 256 * 1024 * 1024
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, key):
+        self.id = job_id
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.owners = set()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, progress, message=""):
+        # Called by the job function; also the point where cancellation lands
+        self.check_cancelled()
+        self.progress = progress
+        self.message = message
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.finished
+
+
+class JobQueue:
+    def __init__(self, max_workers=None, max_jobs=64, max_finished_bytes=DEFAULT_MAX_FINISHED_BYTES):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_jobs = max_jobs
+        self.max_finished_bytes = max_finished_bytes
+        self.finished_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="co-job")
+        self._jobs = {}  # key -> Job, queued or running
+        self._owned = OrderedDict()  # owner -> Job, least recently used first
+        self._kept = {}  # owner -> size of the finished result its Job holds
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, owner, key, func, *args, **kwargs):
+        # Run func(job, *args, **kwargs) for key on behalf of owner. Returns
+        # the Job; its result is whatever func returns.
+        with self._lock:
+            current = self._owned.get(owner)
+            if current is not None and current.key == key and current.status not in (FAILED, CANCELLED):
+                self._owned.move_to_end(owner)
+                return current
+            job = self._jobs.get(key)
+            if job is None or job.cancelled:
+                if len(self._jobs) >= self.max_jobs:
+                    raise RuntimeError("Too many jobs in progress, try again shortly")
+                job = Job(next(self._ids), key)
+                self._jobs[key] = job
+                self._executor.submit(self._run, job, func, args, kwargs)
+            self._follow(owner, job)
+            return job
+
+    def current(self, owner):
+        with self._lock:
+            job = self._owned.get(owner)
+            if job is not None:
+                self._owned.move_to_end(owner)
+            return job
+
+    def release(self, owner):
+        # Owner no longer wants its job (new upload, session closed, ...)
+        with self._lock:
+            self._follow(owner, None)
+
+    def _follow(self, owner, job):
+        previous = self._owned.pop(owner, None)
+        self.finished_bytes -= self._kept.pop(owner, 0)
+        if previous is not None and previous is not job:
+            previous.owners.discard(owner)
+            if not previous.owners and not previous.finished:
+                previous.cancel()
+        if job is not None and not job.finished:
+            job.owners.add(owner)
+            self._owned[owner] = job
+
+    def _trim(self):
+        # Drop the least recently used finished results over the byte budget
+        for owner in list(self._owned):
+            if self.finished_bytes <= self.max_finished_bytes:
+                break
+            if owner in self._kept:
+                self._follow(owner, None)
+
+    def _run(self, job, func, args, kwargs):
+        size = 0
+        try:
+            job.check_cancelled()
+            job.status = RUNNING
+            job.result = func(job, *args, **kwargs)
+            size = estimate_size(job.result)
+            job.progress = 1.0
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+        finally:
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+                # Owners still following the job keep a successful result;
+                # after a failure, submitting the key again starts a new job
+                for owner in job.owners:
+                    if self._owned.get(owner) is not job:
+                        continue
+                    if job.status == DONE:
+                        self._kept[owner] = size
+                        self.finished_bytes += size
+                    else:
+                        del self._owned[owner]
+                self._trim()
+            job._done.set()
+
+
+# Shared by every session in the server process
+shared_queue = JobQueue()
@@ -0,0 +1,73 @@
+import io
+
+import pandas as pd
+
+from co_processing import CoAggregates, find_co_row
+from profiling import Profiler, shape_of
+from result_cache import shared_cache, make_key
+from score_index import ScoreIndex
+from table_view import marks_stats, sheet_stats
+
+# The raw-data app's heavy stages, written as job_queue jobs: each takes the
+# Job first, reports progress between steps and stores what it builds in the
+# shared result cache, so a rerun or another session picks it up for free.
+# Every result carries the stage timings under "profile". Download files
+# are not built here (see exports.py), and neither are full display tables:
+# the app pages through df and ProcessedMarks and shows the column
+# statistics computed here (see table_view.py).
+
+
+def parse_upload(job, file_bytes, file_hash):
+    # Parse the workbook, find the CO row and build the weight-independent aggregates.
+    # Unlike the batch CLI and the API's /attainment this reads the whole
+    # sheet: the app pages through it and rescales the cached aggregates on
+    # every weight change instead of re-reading the file.
+    profiler = Profiler()
+    job.report(0.05, "Reading workbook")
+    with profiler.stage("read_excel") as record:
+        df = shape_of(record, shared_cache.get_or_compute(
+            make_key("parsed", file_hash),
+            lambda: pd.read_excel(io.BytesIO(file_bytes), header=None)
+        ))
+    job.report(0.6, "Finding CO labels")
+    with profiler.stage("find_co_row", *df.shape):
+        co_row = shared_cache.get_or_compute(make_key("co_row", file_hash), lambda: find_co_row(df))
+    aggregates = None
+    if co_row is not None:
+        job.report(0.8, "Grouping CO columns")
+        with profiler.stage("aggregates") as record:
+            aggregates = shared_cache.get_or_compute(
+                make_key("aggregates", file_hash),
+                lambda: CoAggregates.from_frame(df, co_row)
+            )
+            shape_of(record, aggregates.fractions)
+    job.report(0.9, "Summarising columns")
+    with profiler.stage("sheet_stats", *df.shape):
+        stats = shared_cache.get_or_compute(make_key("sheet_stats", file_hash), lambda: sheet_stats(df, co_row))
+    return {"df": df, "co_row": co_row, "aggregates": aggregates, "stats": stats, "profile": profiler.stages}
+
+
+def process_upload(job, file_hash, aggregates, co_weights, round_digits):
+    # Weighted marks (as ProcessedMarks), the score index and per-CO statistics
+    profiler = Profiler()
+    process_params = dict(co_weights=co_weights, round_digits=round_digits)
+    job.report(0.05, "Scaling marks")
+    with profiler.stage("weighted_marks") as record:
+        processed = shared_cache.get_or_compute(
+            make_key("processed", file_hash, **process_params),
+            lambda: aggregates.processed(co_weights, round_digits)
+        )
+        shape_of(record, processed.marks)
+    job.report(0.3, "Indexing scores")
+    with profiler.stage("score_index", *processed.marks.shape):
+        score_index = shared_cache.get_or_compute(
+            make_key("score_index", file_hash, **process_params),
+            lambda: ScoreIndex.from_processed(processed)
+        )
+    job.report(0.8, "Summarising scores")
+    with profiler.stage("marks_stats", *processed.marks.shape):
+        stats = shared_cache.get_or_compute(
+            make_key("marks_stats", file_hash, **process_params),
+            lambda: marks_stats(score_index)
+        )
+    return {"processed": processed, "score_index": score_index, "stats": stats, "profile": profiler.stages}
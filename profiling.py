@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Per-stage instrumentation for the attainment pipelines: wall time, the
+# row/column counts a stage handled and, optionally, the peak traced memory
+# while it ran. Records are plain dicts so they can be shown in the
+# Streamlit diagnostics panel, returned from worker processes or dumped as
+# JSON from headless runs.
+#
+# Memory tracking uses tracemalloc, which slows Python allocations down, so
+# it is off unless asked for or COATTAINMENT_TRACK_MEMORY=1 is set. A
+# stage's peak is counted from what was already allocated when it started,
+# so it doesn't inherit earlier stages' peaks. It is process-wide: stages
+# running concurrently in other threads add to it.
+
+TRACK_MEMORY_ENV = "COATTAINMENT_TRACK_MEMORY"
+
+# Highest peak seen so far by each stage being traced. A stage resets
+# tracemalloc's peak when it starts, so the stages around it fold the peak
+# in first and keep it.
+_open_peaks = {}
+_peaks_lock = threading.Lock()
+
+
+def _fold_peak():
+    with _peaks_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        for token, seen in _open_peaks.items():
+            _open_peaks[token] = max(seen, peak)
+
+
+def _track_memory_default():
+    return os.environ.get(TRACK_MEMORY_ENV, "").lower() in ("1", "true", "yes")
+
+
+class Profiler:
+    def __init__(self, track_memory=None):
+        self.track_memory = _track_memory_default() if track_memory is None else track_memory
+        self.stages = []
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, rows=None, columns=None):
+        # The yielded record can be updated inside the block, e.g. with the
+        # shape of what the stage produced
+        record = {"stage": name, "rows": rows, "columns": columns, "seconds": None, "peak_memory_bytes": None}
+        if self.track_memory:
+            _fold_peak()
+            token = object()
+            with _peaks_lock:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                _open_peaks[token] = base
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.track_memory:
+                _fold_peak()
+                with _peaks_lock:
+                    record["peak_memory_bytes"] = _open_peaks.pop(token) - base
+            self.stages.append(record)
+
+    def extend(self, records, prefix=None):
+        # Merge records from another profiler, e.g. a background job's
+        for record in records:
+            record = dict(record)
+            if prefix:
+                record["stage"] = f"{prefix}.{record['stage']}"
+            self.stages.append(record)
+
+    @property
+    def total_seconds(self):
+        return sum(record["seconds"] or 0.0 for record in self.stages)
+
+    def to_dict(self):
+        return {"total_seconds": self.total_seconds, "stages": list(self.stages)}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_frame(self):
+        return pd.DataFrame(self.stages, columns=["stage", "rows", "columns", "seconds", "peak_memory_bytes"])
+
+
+def shape_of(record, value):
+    # Fill a stage record's rows/columns from a frame or array
+    shape = getattr(value, "shape", None)
+    if shape is not None and len(shape) >= 1:
+        record["rows"] = int(shape[0])
+        record["columns"] = int(shape[1]) if len(shape) > 1 else 1
+    return value
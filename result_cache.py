@@ -0,0 +1,118 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Process-wide cache for parsed workbooks, processed frames and serialized
+# downloads. Entries are keyed by the upload's content hash plus the
+# processing parameters, so every session on the server shares one copy and
+# Streamlit reruns hit the cache instead of re-parsing. Cached objects are
+# shared: callers must treat them as read-only.
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 256
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _freeze(value):
+    # Turn dicts/lists into hashable, order-independent tuples for cache keys
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def make_key(kind, digest, **params):
+    return (kind, digest, _freeze(params))
+
+
+def estimate_size(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value) + 64
+    if isinstance(value, dict):
+        # e.g. the HTTP API's JSON-ready responses, records and mark lists included
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items()) + 64
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, (str, int, float)):
+        return sys.getsizeof(value)
+    return 64
+
+
+class ResultCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, size), oldest first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            # Values larger than the whole budget are returned but not kept
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        # Drop least recently used entries until both limits hold
+        while self._entries and (self.nbytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+
+
+# Shared by every session in the server process
+shared_cache = ResultCache()
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from co_processing import attainment_summary
+
+# Per-CO sorted-score index over a processed dataset. Sorting once costs
+# O(students log students); afterwards "how many students scored at least X"
+# is a binary search, so sweeping many thresholds or level cutoffs never
+# rescans the marks.
+
+
+class ScoreIndex:
+    def __init__(self, unique_cos, marks, max_marks=None):
+        # marks: (students x COs) weighted marks; max_marks: {co: max mark}
+        marks = np.asarray(marks, dtype=np.float64).reshape(-1, len(unique_cos))
+        self.unique_cos = list(unique_cos)
+        self.max_marks = dict(max_marks) if max_marks is not None else None
+        self.total_students = marks.shape[0]
+        # np.sort puts NaN last; missing marks never meet a threshold
+        self.sorted_marks = np.sort(marks, axis=0)
+        self.valid_counts = (~np.isnan(marks)).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.means = np.nanmean(marks, axis=0) if len(marks) else np.full(len(unique_cos), np.nan)
+
+    @property
+    def nbytes(self):
+        # Footprint of the index arrays, used by result_cache for eviction
+        return self.sorted_marks.nbytes + self.means.nbytes + self.valid_counts.nbytes
+
+    @classmethod
+    def from_aggregates(cls, aggregates, co_weights, round_digits=2):
+        # Index over the weighted marks process_co_data would produce
+        marks = aggregates.weighted_marks(co_weights, round_digits)
+        return cls(aggregates.unique_cos, marks, aggregates.scaling.weighted_max_marks(co_weights))
+
+    @classmethod
+    def from_processed(cls, processed):
+        # Index over a ProcessedMarks score array
+        return cls(processed.unique_cos, processed.marks, processed.weighted_max_marks)
+
+    @classmethod
+    def from_frame(cls, df, max_marks):
+        # One column per CO, e.g. streamlit_app.py's "CO1 (30)" columns
+        cos = list(max_marks)
+        return cls(cos, df[cos].to_numpy(dtype=np.float64), max_marks)
+
+    def _column(self, k):
+        return self.sorted_marks[:self.valid_counts[k], k]
+
+    def count_at_least(self, co, score):
+        # Students with a mark >= score for one CO; score may be an array
+        k = self.unique_cos.index(co)
+        column = self._column(k)
+        return len(column) - np.searchsorted(column, score, side="left")
+
+    def counts_at_least(self, scores):
+        # scores: one per CO, or a (thresholds x COs) array; same shape back
+        scores = np.asarray(scores, dtype=np.float64)
+        counts = np.empty(scores.shape, dtype=np.int64)
+        for k in range(len(self.unique_cos)):
+            column = self._column(k)
+            counts[..., k] = len(column) - np.searchsorted(column, scores[..., k], side="left")
+        return counts
+
+    def attainment_curve(self, thresholds=None):
+        # Attainment (%) of every CO for each proficiency threshold, given as
+        # a fraction of the CO's max marks (default 0%, 1%, ..., 100%).
+        # Returns a frame indexed by threshold (%) with one column per CO.
+        if self.max_marks is None:
+            raise ValueError("Attainment curves need the max marks of each CO")
+        if thresholds is None:
+            thresholds = np.linspace(0.0, 1.0, 101)
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        max_marks = np.array([self.max_marks[co] for co in self.unique_cos], dtype=np.float64)
+        counts = self.counts_at_least(thresholds[:, None] * max_marks)
+        percentages = counts / self.total_students * 100 if self.total_students else np.full(counts.shape, np.nan)
+        return pd.DataFrame(percentages, index=pd.Index(thresholds * 100, name="Threshold (%)"),
+                            columns=self.unique_cos)
+
+    def distribution(self, bins=20):
+        # Students per score band, the bands being equal fractions of each
+        # CO's max marks (the last one also holds scores above the max).
+        # Counted from the sorted scores, so the cost doesn't grow with the
+        # class. Returns a frame indexed by band with one column per CO.
+        if self.max_marks is None:
+            raise ValueError("Score distributions need the max marks of each CO")
+        fractions = np.linspace(0.0, 1.0, bins + 1)
+        max_marks = np.array([self.max_marks[co] for co in self.unique_cos], dtype=np.float64)
+        at_least = self.counts_at_least(fractions[1:-1, None] * max_marks)
+        counts = -np.diff(np.vstack([self.valid_counts, at_least, np.zeros(len(self.unique_cos), np.int64)]), axis=0)
+        bands = [f"{low * 100:g}-{high * 100:g}%" for low, high in zip(fractions[:-1], fractions[1:])]
+        return pd.DataFrame(counts, index=pd.Index(bands, name="Score (% of max)"), columns=self.unique_cos)
+
+    def summary(self, attain_level_3_min=80, attain_level_2_min=60, attain_level_1_min=50,
+                threshold=0.6, method="threshold", report=None):
+        # Same table as compute_attainment_both_options, answered from the index
+        if method == "threshold":
+            if self.max_marks is None:
+                raise ValueError("The threshold method needs the max marks of each CO")
+            thresholds = {co: threshold * self.max_marks[co] for co in self.unique_cos}
+        elif method == "average":
+            thresholds = dict(zip(self.unique_cos, self.means.tolist()))
+        else:
+            raise ValueError("Invalid method. Choose either 'threshold' or 'average'.")
+        if report is not None:
+            report(f"Thresholds calculated: {thresholds}")
+
+        counts = self.counts_at_least([thresholds[co] for co in self.unique_cos])
+        results = {co: counts[k] for k, co in enumerate(self.unique_cos)}
+        return attainment_summary(self.unique_cos, results, self.total_students, attain_level_3_min,
+                                  attain_level_2_min, attain_level_1_min, threshold, method)
@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
-import re
 import io
+import sqlite3
+from header_attainment import process_file
+from trend_store import TrendStore
 
 # Sample data
 data = {
@@ -17,57 +19,6 @@ data = {
 df_students = pd.DataFrame(data)
 
 
-# Function to process the uploaded Excel file
-def process_file(uploaded_file, threshold):
-    # Load data from the uploaded Excel file
-    df = pd.read_excel(uploaded_file)
-
-    # Extract maximum marks for each CO from the column headers
-    max_marks = {}
-    for column in df.columns:
-        if 'CO' in column:
-            match = re.search(r'\((\d+)\)', column)
-            if match:
-                max_marks[column] = int(match.group(1))
-
-    # Define expected proficiency thresholds based on user input
-    thresholds = {co: threshold * max_marks[co] for co in max_marks}
-
-    # Count number of students
-    total_students = len(df)
-
-    # Count students who met or exceeded expected proficiencies
-    results = {}
-    for co, min_score in thresholds.items():
-        results[co] = (df[co] >= min_score).sum()
-
-    # Calculate Course Outcome attainment percentages
-    attainment_percentages = {co: (count / total_students) * 100 for co, count in results.items()}
-
-    # Determine CO attainment levels
-    attainment_levels = {}
-    for co, percentage in attainment_percentages.items():
-        if percentage >= 80:
-            attainment_levels[co] = 3
-        elif percentage >= 70:
-            attainment_levels[co] = 2
-        else:
-            attainment_levels[co] = 1
-
-    # Summary of outcomes
-    summary = {
-        'CO': list(max_marks.keys()),
-        'Expected Proficiency (%)': [threshold * 100] * len(max_marks),
-        'No of Students Scored Expected Marks': [results[co] for co in max_marks],
-        'Course Outcome Attainment (%)': [attainment_percentages[co] for co in max_marks],
-        'CO Attainment Level': [attainment_levels[co] for co in max_marks]
-    }
-
-    # Create a DataFrame for summary
-    summary_df = pd.DataFrame(summary)
-    
-    return summary_df
-
 # Streamlit app layout
 st.title("Course Outcome Attainment Analysis")
 # Display the DataFrame as a table
@@ -82,15 +33,30 @@ threshold = st.number_input("Enter Proficiency Threshold (as a decimal, e.g., 0.
 # File uploader
 uploaded_file = st.file_uploader("Upload Excel File", type=["xlsx"])
 
+# Optionally keep each result in the attainment history (see trend_store.py)
+col1, col2 = st.columns(2)
+course = col1.text_input("Course")
+term = col2.text_input("Term")
+save_to_history = st.checkbox("Save results to the attainment history")
+
 # Process and display results when the button is clicked
 if st.button("Process File"):
     if uploaded_file is not None:
-        summary_df = process_file(uploaded_file, threshold)
+        summary_df = process_file(uploaded_file, threshold, report=st.warning)
         
         # Display the summary DataFrame
         st.write("### Summary of Course Outcomes:")
         st.write("## Current Attaiment Values are based on: 3 if Attainment percentage >= 80, 2 if >= 70, 1 otherwise.")
         st.dataframe(summary_df)
+        if save_to_history:
+            try:
+                TrendStore().save_run(course, term, summary_df, threshold=threshold, levels=(80, 70, 0),
+                                      source="header")
+                st.success(f"Saved to the attainment history as {course}, {term}")
+            except ValueError as e:
+                st.error(f"Error: {e}")
+            except sqlite3.Error as e:
+                st.error(f"Error saving to the attainment history: {e}")
 
         # Prepare to download the summary as an Excel file
         buffer = io.BytesIO()
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+# Display helpers for large classes. The app never sends a whole sheet to
+# the browser: tables are shown a page at a time, alongside column
+# statistics computed once per file (or per processing run) in the
+# background jobs, and score charts are built from a fixed number of bands,
+# so what reaches the browser doesn't grow with the class size.
+# Kept free of streamlit like header_attainment.py.
+
+PAGE_SIZES = (50, 100, 500, 1000)
+
+
+def page_count(total_rows, page_size):
+    return max(1, -(-total_rows // page_size))
+
+
+def page_bounds(total_rows, page, page_size):
+    # [start, stop) rows of a 1-based page, clamped to the table
+    page = min(max(int(page), 1), page_count(total_rows, page_size))
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total_rows)
+
+
+def _column_names(df, co_row):
+    # Labels of the sheet's columns from its CO row, where there is one
+    if co_row is None:
+        return [f"Column {j + 1}" for j in range(df.shape[1])]
+    names = []
+    for j, label in enumerate(df.iloc[co_row].tolist()):
+        names.append(label.strip() if isinstance(label, str) and label.strip() else f"Column {j + 1}")
+    return names
+
+
+def sheet_stats(df, co_row=None):
+    # Per-column statistics of the uploaded sheet's student rows (everything
+    # below the max marks row): filled and numeric cells, min, mean and max.
+    # infer_objects types the all-number columns in one pass; only the
+    # mixed ones go through to_numeric.
+    students = (df.iloc[co_row + 2:] if co_row is not None else df).infer_objects()
+    rows = []
+    for j, name in enumerate(_column_names(df, co_row)):
+        column = students.iloc[:, j]
+        numbers = column if pd.api.types.is_numeric_dtype(column) else pd.to_numeric(column, errors="coerce")
+        numeric = int(numbers.notna().sum())
+        rows.append({
+            "Column": name,
+            "Filled": int(column.notna().sum()),
+            "Numeric": numeric,
+            "Min": numbers.min() if numeric else np.nan,
+            "Mean": numbers.mean() if numeric else np.nan,
+            "Max": numbers.max() if numeric else np.nan,
+        })
+    return pd.DataFrame(rows, columns=["Column", "Filled", "Numeric", "Min", "Mean", "Max"])
+
+
+def marks_stats(score_index):
+    # Per-CO statistics of the weighted marks, read from the index's sorted
+    # scores (the minimum, maximum and quartiles need no further sorting)
+    rows = []
+    for k, co in enumerate(score_index.unique_cos):
+        column = score_index.sorted_marks[:score_index.valid_counts[k], k]
+        filled = len(column)
+        quartiles = np.quantile(column, [0.25, 0.5, 0.75]) if filled else np.full(3, np.nan)
+        rows.append({
+            "CO": co,
+            "Weighted Max Marks": score_index.max_marks[co] if score_index.max_marks else np.nan,
+            "Students": filled,
+            "Missing": score_index.total_students - filled,
+            "Mean": score_index.means[k],
+            "Std": column.std(ddof=1) if filled > 1 else np.nan,
+            "Min": column[0] if filled else np.nan,
+            "25%": quartiles[0],
+            "Median": quartiles[1],
+            "75%": quartiles[2],
+            "Max": column[-1] if filled else np.nan,
+        })
+    return pd.DataFrame(rows).set_index("CO")
+
+
+def processed_page(processed, start, stop):
+    # Rows [start, stop) of ProcessedMarks as a typed frame: the student and
+    # one column per CO. Only this slice is converted.
+    marks = np.asarray(processed.marks[start:stop], dtype=np.float64)
+    if processed.marks.dtype != np.float64 and processed.round_digits is not None:
+        marks = np.round(marks, processed.round_digits)
+    page = pd.DataFrame(marks, columns=processed.unique_cos, index=pd.RangeIndex(start + 1, stop + 1))
+    page.insert(0, "Student", processed.student_ids[start:stop])
+    return page
+
+
+def distribution_chart(distribution, co):
+    # echarts options for one CO's column of ScoreIndex.distribution()
+    return {
+        "title": {"text": f"{co} Score Distribution", "left": "center"},
+        "tooltip": {"trigger": "axis"},
+        "xAxis": {"type": "category", "data": distribution.index.tolist(), "name": distribution.index.name},
+        "yAxis": {"type": "value", "name": "Students"},
+        "series": [
+            {
+                "name": co,
+                "type": "bar",
+                "data": distribution[co].tolist(),
+                "label": {"show": True, "position": "top"},
+            }
+        ],
+        "toolbox": {
+            "show": True,
+            "feature": {"saveAsImage": {"type": "jpeg", "name": f"{co}_Score_Distribution"}},
+        },
+    }
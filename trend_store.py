@@ -0,0 +1,278 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from co_columns import PANDAS_DUPLICATE, match_co_label
+from co_processing import header_metadata
+
+# Local history of attainment runs, so CO attainment can be compared across
+# terms and courses (e.g. for accreditation) without re-uploading old
+# workbooks. Each saved run keeps its parameters and one row per CO with the
+# summary table's values plus, when known, the per-CO class average and max
+# marks. Everything lives in one SQLite file (COATTAINMENT_TREND_DB, default
+# co_attainment_history.sqlite3), indexed by course, term and CO, which is
+# only created when the store is first used.
+#
+# A course/term pair can be saved more than once; trend queries use its
+# latest run. Terms are ordered as strings, so name them to sort, e.g.
+# "2023-1", "2023-2", "2024-1".
+
+TREND_DB_ENV = "COATTAINMENT_TREND_DB"
+DEFAULT_DB = "co_attainment_history.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    course TEXT NOT NULL,
+    term TEXT NOT NULL,
+    saved_at TEXT NOT NULL,
+    source TEXT,
+    method TEXT,
+    threshold REAL,
+    levels TEXT,
+    total_students INTEGER,
+    file_hash TEXT,
+    params TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_course_term ON runs (course, term, id);
+CREATE TABLE IF NOT EXISTS co_results (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    course TEXT NOT NULL,
+    term TEXT NOT NULL,
+    co TEXT NOT NULL,
+    co_number INTEGER NOT NULL,
+    expected_proficiency TEXT,
+    students_met INTEGER,
+    attainment_pct REAL,
+    level INTEGER,
+    mean_score REAL,
+    max_marks REAL
+);
+CREATE INDEX IF NOT EXISTS co_results_course_term_co ON co_results (course, term, co);
+CREATE INDEX IF NOT EXISTS co_results_co_term ON co_results (co, term);
+CREATE INDEX IF NOT EXISTS co_results_run ON co_results (run_id);
+"""
+
+# Latest run of every course/term pair (optionally filtered, see _where)
+LATEST_RUNS = "SELECT MAX(id) FROM runs{where} GROUP BY course, term"
+
+# Output column names, matching the summary table
+COLUMNS = {
+    "expected_proficiency": "Expected Proficiency (%)",
+    "students_met": "No of Students Scored Expected Marks",
+    "attainment_pct": "Course Outcome Attainment (%)",
+    "level": "CO Attainment Level",
+    "mean_score": "Mean Score",
+    "max_marks": "Max Marks",
+}
+
+
+# Header metadata keys that name the course and the term, in order of preference
+COURSE_KEYS = ("Course", "Course Code", "Course Name", "Subject", "Subject Code")
+TERM_KEYS = ("Term", "Semester", "Session", "Academic Year", "Year")
+
+
+def default_path():
+    return os.environ.get(TREND_DB_ENV, DEFAULT_DB)
+
+
+def course_and_term(headers):
+    # Defaults for the course and term of a sheet from the rows above its CO
+    # row ("Course: CS101", "Semester: 2024-1"); "" when the sheet has none
+    metadata = {str(key).strip().lower(): value for key, value in header_metadata(headers).items()}
+
+    def first(keys):
+        for key in keys:
+            value = metadata.get(key.lower())
+            if value is not None and str(value).strip():
+                return str(value).strip()
+        return ""
+    return first(COURSE_KEYS), first(TERM_KEYS)
+
+
+def _co_number(co):
+    match = match_co_label(co)
+    return int(match[0][2:]) if match else 0
+
+
+def _where(prefix="", **filters):
+    # WHERE clause and arguments for the filters that are given. Only naming
+    # those lets SQLite use the (course, term, co) indexes.
+    given = [(column, value) for column, value in filters.items() if value is not None]
+    if not given:
+        return "", []
+    return " WHERE " + " AND ".join(f"{prefix}{column} = ?" for column, _ in given), [value for _, value in given]
+
+
+def _number(value):
+    # SQLite-friendly scalar: numpy types to Python, NaN to NULL
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _pivot(results, index, value):
+    # A header-layout sheet may assess one CO in several columns ("CO1 (30)"
+    # and "CO1 (20)"), saved as separate rows of one run; they are averaged
+    table = results.pivot_table(index=index, columns="CO", values=value, aggfunc="mean", dropna=False)
+    return table[sorted(table.columns, key=_co_number)]
+
+
+class TrendStore:
+    def __init__(self, path=None):
+        # Nothing is opened here: the file and its tables are created on first use
+        self.path = path or default_path()
+        self._schema_ready = False
+
+    def exists(self):
+        # Whether anything was ever saved here; lets a page skip an empty
+        # history without creating the file
+        return os.path.exists(self.path)
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the store usable from
+        # Streamlit's and the job queue's threads; commits on success
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute("PRAGMA foreign_keys = ON")
+            connection.execute("PRAGMA journal_mode = WAL")
+            if not self._schema_ready:
+                connection.executescript(SCHEMA)
+                self._schema_ready = True
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def save_run(self, course, term, summary_df, method="threshold", threshold=None, levels=None,
+                 score_index=None, total_students=None, file_hash=None, source=None, params=None):
+        # Store one summary table (compute_attainment_both_options, process_file
+        # or ScoreIndex.summary). score_index adds per-CO means and max marks.
+        # Returns the run id.
+        if not course or not term:
+            raise ValueError("Course and term are needed to save a run")
+        stats = {}
+        if score_index is not None:
+            total_students = score_index.total_students if total_students is None else total_students
+            for k, co in enumerate(score_index.unique_cos):
+                max_marks = score_index.max_marks.get(co) if score_index.max_marks else None
+                stats[co] = (score_index.means[k], max_marks)
+        rows = []
+        for record in summary_df.to_dict(orient="records"):
+            label = record["CO"]
+            # A repeated header-layout column ("CO1 (30).1") is the same CO
+            match = match_co_label(PANDAS_DUPLICATE.sub("", label) if isinstance(label, str) else label)
+            co, header_max = match if match else (str(label), None)
+            mean_score, max_marks = stats.get(label, (None, header_max))
+            rows.append((co, _co_number(co), str(record["Expected Proficiency (%)"]),
+                         _number(record["No of Students Scored Expected Marks"]),
+                         _number(record["Course Outcome Attainment (%)"]),
+                         _number(record["CO Attainment Level"]), _number(mean_score), _number(max_marks)))
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO runs (course, term, saved_at, source, method, threshold, levels, total_students, "
+                "file_hash, params) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(course), str(term), time.strftime("%Y-%m-%dT%H:%M:%S"), source, method, _number(threshold),
+                 json.dumps(list(levels)) if levels is not None else None, _number(total_students), file_hash,
+                 json.dumps(params, default=str) if params is not None else None)
+            )
+            run_id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO co_results (run_id, course, term, co, co_number, expected_proficiency, students_met, "
+                "attainment_pct, level, mean_score, max_marks) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, str(course), str(term)) + row for row in rows]
+            )
+        return run_id
+
+    def delete_run(self, run_id):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def _frame(self, sql, args=()):
+        with self._connect() as connection:
+            return pd.read_sql_query(sql, connection, params=args)
+
+    def courses(self):
+        return self._frame("SELECT DISTINCT course FROM runs ORDER BY course")["course"].tolist()
+
+    def terms(self, course=None):
+        if course is None:
+            return self._frame("SELECT DISTINCT term FROM runs ORDER BY term")["term"].tolist()
+        return self._frame("SELECT DISTINCT term FROM runs WHERE course = ? ORDER BY term", (course,))["term"].tolist()
+
+    def runs(self, course=None, term=None):
+        # Saved runs, newest first
+        where, args = _where(course=course, term=term)
+        return self._frame(f"SELECT * FROM runs{where} ORDER BY id DESC", args)
+
+    def results(self, course=None, term=None, cos=None, latest=True):
+        # One row per course, term and CO; with latest=False every run shows up
+        sql = ("SELECT r.run_id AS run_id, r.course AS Course, r.term AS Term, r.co AS CO, "
+               + ", ".join(f"r.{column} AS \"{name}\"" for column, name in COLUMNS.items())
+               + " FROM co_results r")
+        where, args = _where("r.", course=course, term=term)
+        clauses = [where[len(" WHERE "):]] if where else []
+        if latest:
+            runs_where, runs_args = _where(course=course, term=term)
+            clauses.append(f"r.run_id IN ({LATEST_RUNS.format(where=runs_where)})")
+            args += runs_args
+        if cos:
+            clauses.append(f"r.co IN ({', '.join('?' * len(cos))})")
+            args += list(cos)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY r.course, r.term, r.co_number, r.run_id"
+        return self._frame(sql, args)
+
+    def trend(self, course, value="Course Outcome Attainment (%)", cos=None):
+        # Terms x COs table of one numeric value over a course's history
+        return _pivot(self.results(course=course, cos=cos), "Term", value)
+
+    def compare_courses(self, term, value="Course Outcome Attainment (%)", cos=None):
+        # Courses x COs table of one numeric value for one term
+        return _pivot(self.results(term=term, cos=cos), "Course", value)
+
+    def trend_chart(self, course, value="Course Outcome Attainment (%)", cos=None):
+        # echarts options: one line per CO across the course's terms
+        table = self.trend(course, value, cos)
+        return {
+            "title": {"text": f"{course}: {value} by term", "left": "center"},
+            "tooltip": {"trigger": "axis"},
+            "legend": {"data": list(table.columns), "top": "10%"},
+            "xAxis": {"type": "category", "data": list(table.index), "name": "Term"},
+            "yAxis": {"type": "value", "name": value},
+            "series": [
+                {"name": co, "type": "line", "connectNulls": True,
+                 "data": [_number(v) for v in table[co].round(2).tolist()]}
+                for co in table.columns
+            ],
+        }
+
+    def histogram_chart(self, course, term):
+        # echarts options for the app's attainment level histogram, from a saved run
+        results = self.results(course=course, term=term)
+        return {
+            "title": {"text": f"CO Attainment Levels: {course}, {term}", "left": "center"},
+            "tooltip": {"trigger": "axis"},
+            "xAxis": {"type": "category", "data": results["CO"].tolist(), "name": "Categories"},
+            "yAxis": {"type": "value", "name": "Values"},
+            "series": [
+                {
+                    "name": "attainment levels",
+                    "type": "bar",
+                    "data": [_number(v) for v in results["CO Attainment Level"].tolist()],
+                    "label": {"show": True, "position": "top"},
+                }
+            ],
+        }
+
@@ -0,0 +1,302 @@
+import codecs
+import csv
+import io
+import os
+import uuid
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from co_columns import CoColumns, is_co_row
+from columnar_io import ProcessedWriter, iter_processed_marks
+from co_processing import CoScaling, attainment_summary, round_marks
+from profiling import Profiler
+
+# Streaming ingestion for large exam exports. The workbook is opened in
+# openpyxl's read-only mode and walked row by row: the CO label row and the
+# max marks row are found among the first rows, then student marks come out
+# in fixed-size float blocks, so memory stays bounded by the block size
+# rather than by the number of students. CSV exports are read the same way.
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_SCAN_ROWS = 100
+CSV_EXTENSIONS = (".csv",)
+# Bytes of a nameless upload looked at to tell a workbook from a CSV file
+SNIFF_BYTES = 4096
+
+
+def _is_empty(row):
+    return all(cell is None for cell in row)
+
+
+def _read_header(rows, scan_rows, close):
+    # Consume rows up to and including the max marks row. Rows above the CO
+    # row are kept as headers, like process_co_data does.
+    headers = []
+    for row in rows:
+        if is_co_row(row):
+            co_labels = list(row)
+            break
+        headers.append(list(row))
+        if len(headers) >= scan_rows:
+            close()
+            raise ValueError(f"No CO labels found in the first {scan_rows} rows")
+    else:
+        close()
+        raise ValueError("No CO labels found in the file")
+    max_marks = list(next(rows, ()))
+    max_marks += [None] * (len(co_labels) - len(max_marks))
+    return headers, co_labels, max_marks
+
+
+class StreamingWorkbook:
+    def __init__(self, source, chunk_size=DEFAULT_CHUNK_SIZE, scan_rows=DEFAULT_SCAN_ROWS, sheet_name=None):
+        # source: path or binary file object of an .xlsx workbook
+        self.chunk_size = chunk_size
+        self._workbook = load_workbook(source, read_only=True, data_only=True)
+        sheet = self._workbook[sheet_name] if sheet_name else self._workbook.worksheets[0]
+        self._rows = sheet.iter_rows(values_only=True)
+        self.headers, self.co_labels, self.max_marks = _read_header(self._rows, scan_rows, self.close)
+        self.co_row = len(self.headers)
+        self.columns = CoColumns(self.co_labels)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._workbook.close()
+
+    def chunks(self, columns=None):
+        # Yield (rows x len(columns)) float64 blocks of student marks. Empty
+        # rows between students count as missing marks; trailing empty rows
+        # are dropped, matching pd.read_excel.
+        if columns is None:
+            columns = np.arange(len(self.co_labels))
+        columns = np.asarray(columns)
+        width = int(columns.max()) + 1 if len(columns) else 0
+        block = []
+        pending_empty = 0
+        for row in self._rows:
+            if _is_empty(row):
+                pending_empty += 1
+                continue
+            for _ in range(pending_empty):
+                block.append([None] * len(columns))
+            pending_empty = 0
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            block.append([row[j] for j in columns])
+            if len(block) >= self.chunk_size:
+                yield np.array(block, dtype=np.float64)
+                block = []
+        if block:
+            yield np.array(block, dtype=np.float64)
+
+
+def _csv_value(cell):
+    # csv yields strings; read numbers back as pd.read_csv would
+    if cell == "":
+        return None
+    for convert in (int, float):
+        try:
+            return convert(cell)
+        except ValueError:
+            pass
+    return cell
+
+
+class StreamingCsv:
+    # StreamingWorkbook for CSV exports: the header rows go through the csv
+    # module, student rows through pandas' C parser a block at a time. Blank
+    # lines are skipped, matching pd.read_csv.
+
+    def __init__(self, source, chunk_size=DEFAULT_CHUNK_SIZE, scan_rows=DEFAULT_SCAN_ROWS, encoding="utf-8-sig"):
+        # source: path, or text or binary file object
+        self.chunk_size = chunk_size
+        # Only files opened here are closed; a caller's file object is left open
+        self._source = source
+        self._owned = isinstance(source, (str, os.PathLike))
+        if self._owned:
+            self._file = open(source, newline="", encoding=encoding)
+        elif isinstance(source, io.TextIOBase):
+            self._file = source
+        else:
+            self._file = io.TextIOWrapper(source, encoding=encoding, newline="")
+        rows = ([_csv_value(cell) for cell in row] for row in csv.reader(self._file) if row)
+        self.headers, self.co_labels, self.max_marks = _read_header(rows, scan_rows, self.close)
+        self.co_row = len(self.headers)
+        self.columns = CoColumns(self.co_labels)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._owned:
+            self._file.close()
+        elif self._file is not self._source:
+            self._file.detach()  # unwrap without closing the caller's binary file
+        self._file = None
+
+    def chunks(self, columns=None):
+        if columns is None:
+            columns = np.arange(len(self.co_labels))
+        columns = [int(j) for j in columns]
+        # Rows may be ragged, so name every column up to the widest one used
+        width = max(columns, default=-1) + 1
+        reader = pd.read_csv(self._file, header=None, names=range(max(width, len(self.co_labels))),
+                             usecols=columns, chunksize=self.chunk_size)
+        for block in reader:
+            yield block[columns].to_numpy(dtype=np.float64)
+
+
+def _is_csv(source):
+    if isinstance(source, (str, os.PathLike)):
+        return str(source).lower().endswith(CSV_EXTENSIONS)
+    name = getattr(source, "name", None)
+    if isinstance(name, str) and name:
+        return name.lower().endswith(CSV_EXTENSIONS)
+    if isinstance(source, io.TextIOBase):
+        return True
+    # Nameless binary object: .xlsx files are ZIP archives, CSV exports are
+    # UTF-8 text; anything else (.xls, PDFs, images) is neither
+    start = source.tell()
+    sample = source.read(SNIFF_BYTES)
+    source.seek(start)
+    if sample.startswith(b"PK\x03\x04"):
+        return False
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        is_text = b"\0" not in sample
+    except UnicodeDecodeError:
+        is_text = False
+    if not is_text:
+        raise ValueError("Unsupported file type: send an .xlsx workbook or a UTF-8 CSV file")
+    return True
+
+
+def open_marks(source, chunk_size=DEFAULT_CHUNK_SIZE, scan_rows=DEFAULT_SCAN_ROWS, sheet_name=None):
+    # StreamingCsv for CSV paths or file objects, StreamingWorkbook otherwise
+    if _is_csv(source):
+        return StreamingCsv(source, chunk_size, scan_rows)
+    return StreamingWorkbook(source, chunk_size, scan_rows, sheet_name)
+
+
+def iter_weighted_marks(workbook, scaling, co_weights, round_digits=2):
+    # Rounded weighted CO marks, block by block, exactly as process_co_data
+    # computes them for the same rows
+    weighted_max = np.array(list(scaling.weighted_max_marks(co_weights).values()), dtype=np.float64)
+    for marks in workbook.chunks(scaling.co_columns):
+        yield round_marks(scaling.fractions(marks) * weighted_max, round_digits)
+
+
+def _partial_path(path):
+    # A unique hidden name next to path with the same extension, which
+    # columnar_format goes by
+    directory, name = os.path.split(os.fspath(path))
+    stem, extension = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.{uuid.uuid4().hex}.partial{extension}")
+
+
+def _spill(blocks, writer):
+    # Pass blocks through while appending them to the processed marks file
+    for block in blocks:
+        writer.write(block)
+        yield block
+
+
+def stream_attainment(source, co_weights, round_digits=2, attain_level_3_min=80, attain_level_2_min=60,
+                      attain_level_1_min=50, threshold=0.6, method="threshold", chunk_size=DEFAULT_CHUNK_SIZE,
+                      profiler=None, output_path=None):
+    # compute_attainment_both_options over a streamed workbook or CSV. The
+    # "average" method needs the per-CO means first, so it reads the marks
+    # twice instead of holding them in memory. A file object source must be
+    # seekable. With output_path (.parquet or .arrow) the processed marks are
+    # also written there block by block (see columnar_io.read_processed), and
+    # the average method's second pass reads that file instead of the source.
+    if method not in ("threshold", "average"):
+        raise ValueError("Invalid method. Choose either 'threshold' or 'average'.")
+    profiler = profiler or Profiler()
+
+    def open_workbook():
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return open_marks(source, chunk_size=chunk_size)
+
+    with profiler.stage("open_workbook") as record:
+        workbook = open_workbook()
+        record["columns"] = len(workbook.co_labels)
+    # The processed marks go to a temporary sibling of output_path, renamed
+    # over it only once the file is complete, so a failure part way through
+    # never leaves a readable but truncated file behind
+    spill_path = _partial_path(output_path) if output_path is not None else None
+    try:
+        with workbook:
+            scaling = CoScaling(workbook.co_labels, workbook.max_marks, workbook.columns)
+            n_cos = len(scaling.unique_cos)
+            weighted_max_marks = scaling.weighted_max_marks(co_weights)
+            blocks = iter_weighted_marks(workbook, scaling, co_weights, round_digits)
+            writer = nullcontext()
+            if spill_path is not None:
+                writer = ProcessedWriter(spill_path, workbook.headers, scaling.unique_cos,
+                                         [weighted_max_marks[co] for co in scaling.unique_cos])
+                blocks = _spill(blocks, writer)
+            with writer:
+                if method == "threshold":
+                    min_scores = np.array([threshold * weighted_max_marks[co] for co in scaling.unique_cos])
+                    with profiler.stage("attainment_pass", columns=n_cos) as record:
+                        met, total_students = count_met(blocks, min_scores)
+                        record["rows"] = total_students
+                else:
+                    with profiler.stage("average_pass", columns=n_cos):
+                        min_scores = column_means(blocks, n_cos)
+        if method == "average":
+            with profiler.stage("attainment_pass", columns=n_cos) as record:
+                if spill_path is not None:
+                    met, total_students = count_met(iter_processed_marks(spill_path), min_scores)
+                else:
+                    with open_workbook() as workbook:
+                        blocks = iter_weighted_marks(workbook, scaling, co_weights, round_digits)
+                        met, total_students = count_met(blocks, min_scores)
+                record["rows"] = total_students
+        if spill_path is not None:
+            os.replace(spill_path, output_path)
+    except BaseException:
+        if spill_path is not None and os.path.exists(spill_path):
+            os.remove(spill_path)
+        raise
+
+    results = {co: met[k] for k, co in enumerate(scaling.unique_cos)}
+    return attainment_summary(scaling.unique_cos, results, total_students, attain_level_3_min,
+                              attain_level_2_min, attain_level_1_min, threshold, method)
+
+
+def count_met(blocks, min_scores):
+    # Students at or above min_scores per CO, and the number of students
+    met = np.zeros(len(min_scores), dtype=np.int64)
+    total_students = 0
+    for block in blocks:
+        met += (block >= min_scores).sum(axis=0)
+        total_students += len(block)
+    return met, total_students
+
+
+def column_means(blocks, n_cos):
+    # Per-CO mean over all blocks, skipping missing marks like DataFrame.mean
+    sums = np.zeros(n_cos)
+    counts = np.zeros(n_cos)
+    for block in blocks:
+        valid = ~np.isnan(block)
+        sums += np.where(valid, block, 0.0).sum(axis=0)
+        counts += valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts